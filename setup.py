@@ -4,18 +4,28 @@
 Создает conda окружение, устанавливает зависимости и настраивает конфигурацию.
 """
 
+import argparse
 import os
 import sys
+import hashlib
+import json
+import pprint
 import subprocess
 import shutil
+from functools import lru_cache
 from pathlib import Path
-import yaml
 
 def run_command(command, description):
-    """Выполнение команды с проверкой результата."""
+    """
+    Выполнение команды с проверкой результата.
+    
+    Args:
+        command: Команда в виде списка аргументов (запускается без shell)
+        description: Описание шага для вывода
+    """
     print(f"🔄 {description}...")
     try:
-        result = subprocess.run(command, shell=True, check=True, capture_output=True, text=True)
+        result = subprocess.run(command, check=True, capture_output=True, text=True)
         print(f"✅ {description} - выполнено")
         return result.stdout
     except subprocess.CalledProcessError as e:
@@ -24,23 +34,53 @@ def run_command(command, description):
         print(f"Ошибки: {e.stderr}")
         return None
 
+@lru_cache(maxsize=None)
+def get_path_executables():
+    """
+    Однократный обход PATH и сбор имен исполняемых файлов.
+    
+    Returns:
+        frozenset: Имена исполняемых файлов (на Windows также без расширения)
+    """
+    pathext = {ext.lower() for ext in os.environ.get("PATHEXT", "").split(os.pathsep) if ext}
+    executables = set()
+    
+    for directory in os.environ.get("PATH", "").split(os.pathsep):
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and os.access(entry.path, os.X_OK):
+                            executables.add(entry.name)
+                            stem, ext = os.path.splitext(entry.name)
+                            if ext.lower() in pathext:
+                                executables.add(stem)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    
+    return frozenset(executables)
+
 def check_system_dependencies():
     """Проверка системных зависимостей."""
     print("\n🔍 Проверка системных зависимостей...")
     
+    executables = get_path_executables()
+    
     # Проверка conda
-    if not shutil.which("conda"):
+    if "conda" not in executables:
         print("❌ Conda не найдена! Установите Miniconda или Anaconda.")
         print("📥 Скачать: https://docs.conda.io/en/latest/miniconda.html")
         return False
     
     # Проверка git
-    if not shutil.which("git"):
+    if "git" not in executables:
         print("❌ Git не найден! Установите Git.")
         return False
     
     # Проверка FFmpeg
-    if not shutil.which("ffmpeg"):
+    if "ffmpeg" not in executables:
         print("⚠️ FFmpeg не найден! Рекомендуется установить для обработки аудио.")
         print("Ubuntu/Debian: sudo apt install ffmpeg")
         print("macOS: brew install ffmpeg")
@@ -50,59 +90,119 @@ def check_system_dependencies():
     print("✅ Основные зависимости проверены")
     return True
 
-def create_directories():
+# Директории проекта (родительские создаются автоматически)
+PROJECT_DIRECTORIES = [
+    "temp/audio",
+    "temp/images",
+    "logs",
+    "docs/examples/voice_examples",
+    "docs/examples/text_examples",
+    "docs/images/screenshots"
+]
+
+# Пустые директории, в которых нужен .gitkeep
+GITKEEP_DIRECTORIES = ["temp/audio", "temp/images", "logs"]
+
+def create_directories(quiet=False):
     """Создание необходимых директорий."""
     print("\n📁 Создание директорий...")
     
-    directories = [
-        "temp",
-        "temp/audio", 
-        "temp/images",
-        "logs",
-        "docs/examples/voice_examples",
-        "docs/examples/text_examples",
-        "docs/images/screenshots"
-    ]
-    
-    for directory in directories:
-        Path(directory).mkdir(parents=True, exist_ok=True)
-        print(f"📂 Создана директория: {directory}")
+    for directory in PROJECT_DIRECTORIES:
+        os.makedirs(directory, exist_ok=True)
+        if not quiet:
+            print(f"📂 Создана директория: {directory}")
     
     # Создаем .gitkeep файлы для пустых директорий
-    gitkeep_dirs = ["temp/audio", "temp/images", "logs"]
-    for directory in gitkeep_dirs:
-        gitkeep_file = Path(directory) / ".gitkeep"
-        gitkeep_file.touch()
+    for directory in GITKEEP_DIRECTORIES:
+        gitkeep_file = os.path.join(directory, ".gitkeep")
+        if not os.path.lexists(gitkeep_file):
+            open(gitkeep_file, "a").close()
+    
+    print(f"✅ Подготовлено директорий: {len(PROJECT_DIRECTORIES)}")
+
+# Кэш списка conda окружений (заполняется при первом запросе)
+_conda_envs = None
+
+def get_conda_envs(refresh=False):
+    """
+    Получение списка путей conda окружений через `conda env list --json`.
+    
+    Args:
+        refresh: Перечитать список, игнорируя кэш
+    """
+    global _conda_envs
+    if _conda_envs is None or refresh:
+        result = run_command(["conda", "env", "list", "--json"], "Проверка существующего окружения")
+        try:
+            _conda_envs = json.loads(result)["envs"] if result else []
+        except (ValueError, KeyError):
+            _conda_envs = []
+    return _conda_envs
+
+def find_conda_env_prefix(env_name):
+    """Поиск пути к conda окружению по имени. Возвращает None если его нет."""
+    for prefix in get_conda_envs():
+        if Path(prefix).name == env_name:
+            return Path(prefix)
+    return None
+
+# Файл внутри окружения с хэшем файлов зависимостей, из которых оно собрано
+ENV_HASH_FILE = ".env_hash"
+
+def compute_dependencies_hash():
+    """Хэш содержимого environment.yml и requirements.txt."""
+    digest = hashlib.sha256()
+    for filename in ("environment.yml", "requirements.txt"):
+        path = Path(filename)
+        if path.exists():
+            digest.update(filename.encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
 
 def setup_conda_environment():
     """Создание и настройка conda окружения."""
     env_name = "amikhalev_hb_2025_06"
+    deps_hash = compute_dependencies_hash()
     
     print(f"\n🐍 Настройка conda окружения '{env_name}'...")
     
     # Проверяем, существует ли окружение
-    result = run_command(f"conda info --envs | grep {env_name}", "Проверка существующего окружения")
-    
-    if result and env_name in result:
+    if prefix := find_conda_env_prefix(env_name):
+        hash_file = prefix / ENV_HASH_FILE
+        if hash_file.exists() and hash_file.read_text().strip() == deps_hash:
+            print(f"✅ Окружение '{env_name}' актуально (зависимости не менялись)")
+            return True
+        
         print(f"⚠️ Окружение '{env_name}' уже существует")
         response = input("Пересоздать окружение? (y/N): ").lower()
         if response == 'y':
-            run_command(f"conda env remove -n {env_name}", f"Удаление существующего окружения {env_name}")
+            run_command(["conda", "env", "remove", "-n", env_name], f"Удаление существующего окружения {env_name}")
         else:
             print("✅ Используем существующее окружение")
             return True
     
     # Создаем окружение из environment.yml
     if Path("environment.yml").exists():
-        success = run_command(f"conda env create -f environment.yml", "Создание окружения из environment.yml")
+        success = run_command(["conda", "env", "create", "-f", "environment.yml"], "Создание окружения из environment.yml")
     else:
         # Создаем базовое окружение
-        success = run_command(f"conda create -n {env_name} python=3.9 -y", "Создание базового окружения")
-        if success:
-            # Устанавливаем зависимости pip
-            run_command(f"conda run -n {env_name} pip install -r requirements.txt", "Установка Python зависимостей")
+        success = run_command(["conda", "create", "-n", env_name, "python=3.9", "-y"], "Создание базового окружения")
+        if success is not None:
+            # Устанавливаем зависимости pip (хэш сохраняется только после успешной установки)
+            success = run_command(["conda", "run", "-n", env_name, "pip", "install", "-r", "requirements.txt"], "Установка Python зависимостей")
+    
+    if success is None:
+        return False
+    
+    # Запоминаем хэш зависимостей, чтобы не пересобирать окружение повторно
+    get_conda_envs(refresh=True)
+    if prefix := find_conda_env_prefix(env_name):
+        try:
+            (prefix / ENV_HASH_FILE).write_text(deps_hash)
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить хэш зависимостей: {e}")
     
-    return success is not None
+    return True
 
 def setup_configuration():
     """Настройка конфигурационных файлов."""
@@ -155,31 +255,65 @@ LOG_LEVEL=INFO
 
 def create_basic_config_file(config_file):
     """Создание базового конфигурационного файла."""
-    config_content = {
-        "bot": {
-            "token": "your_telegram_bot_token_here"
-        },
-        "huggingface": {
-            "api_key": "your_huggingface_api_key_here",
-            "model": "black-forest-labs/FLUX.1-dev",
-            "timeout": 60
-        },
-        "whisper": {
-            "model": "small",
-            "device": "cpu", 
-            "language": "ru"
-        },
-        "security": {
-            "max_voice_duration": 60,
-            "rate_limit_messages": 10
-        },
-        "logging": {
-            "level": "INFO"
-        }
-    }
+    config_content = """bot:
+  token: your_telegram_bot_token_here
+huggingface:
+  api_key: your_huggingface_api_key_here
+  model: black-forest-labs/FLUX.1-dev
+  timeout: 60
+whisper:
+  model: small
+  device: cpu
+  language: ru
+security:
+  max_voice_duration: 60
+  rate_limit_messages: 10
+logging:
+  level: INFO
+"""
     
     with open(config_file, "w", encoding="utf-8") as f:
-        yaml.dump(config_content, f, default_flow_style=False, allow_unicode=True)
+        f.write(config_content)
+
+def compile_main_config(source="conf/config.yaml", target="src/utils/_compiled_config.py"):
+    """
+    Предкомпиляция основной конфигурации в Python модуль.
+    
+    Импорт .pyc значительно быстрее разбора YAML при каждом запуске бота.
+    Модуль хранит mtime исходного файла: если YAML изменился, загрузчик
+    конфигурации игнорирует устаревший модуль и разбирает YAML заново.
+    """
+    print("\n⚡ Предкомпиляция конфигурации...")
+    
+    source_path = Path(source)
+    if not source_path.exists():
+        print(f"⚠️ Основная конфигурация не найдена: {source_path}")
+        return
+    
+    # yaml нужен только на этом шаге, поэтому импортируем его лениво.
+    # Используем C-реализацию LibYAML если она доступна
+    import yaml
+    try:
+        from yaml import CSafeLoader as Loader
+    except ImportError:
+        from yaml import SafeLoader as Loader
+    
+    raw = source_path.read_bytes()
+    data = yaml.load(raw, Loader=Loader) or {}
+    
+    module_content = (
+        '"""\n'
+        f"Автоматически сгенерировано setup.py из {source}. Не редактировать вручную.\n"
+        '"""\n\n'
+        f"SOURCE_MTIME = {source_path.stat().st_mtime!r}\n"
+        f"CONFIG_HASH = {hashlib.sha256(raw).hexdigest()!r}\n\n"
+        f"CONFIG = {pprint.pformat(data, sort_dicts=False)}\n"
+    )
+    
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(module_content)
+    
+    print(f"✅ Конфигурация скомпилирована: {target}")
 
 def create_run_scripts():
     """Создание скриптов для запуска."""
@@ -286,6 +420,10 @@ def print_next_steps():
 
 def main():
     """Основная функция установки."""
+    parser = argparse.ArgumentParser(description="Автоматическая установка Birthday Bot")
+    parser.add_argument("--quiet", action="store_true", help="Сокращенный вывод")
+    args = parser.parse_args()
+    
     print("🎉 Birthday Bot - Автоматическая установка")
     print("="*50)
     
@@ -294,16 +432,17 @@ def main():
         print("\n❌ Установка прервана из-за отсутствующих зависимостей")
         sys.exit(1)
     
-    # Создаем директории
-    create_directories()
-    
-    # Настраиваем conda окружение
+    # Настраиваем conda окружение (самый долгий шаг, выполняется первым)
     if not setup_conda_environment():
         print("\n❌ Ошибка создания conda окружения")
         sys.exit(1)
     
-    # Настраиваем конфигурацию
+    # Создаем директории
+    create_directories(quiet=args.quiet)
+    
+    # Настраиваем конфигурацию и предкомпилируем ее
     setup_configuration()
+    compile_main_config()
     
     # Создаем скрипты запуска
     create_run_scripts()
@@ -3,23 +3,59 @@
 Отвечает за управление экземпляром бота и диспетчера.
 """
 
+import asyncio
+import logging
+import os
+from functools import lru_cache
+from dataclasses import dataclass, asdict
+
 from aiogram import Bot, Dispatcher
-from aiogram.types import BotCommand, ChatMember
+from aiogram.types import BotCommand, ChatMember, ChatMemberRestricted
 from aiogram.types import FSInputFile
-from typing import List, Union, Dict, Any
+from typing import Union, Dict, Any, Optional, Tuple
 from pathlib import Path
 
 from src.utils.logger import get_bot_logger
 
 # Команды бота
-BOT_COMMANDS = [
-    {"command": "start", "description": "🎉 Начать работу с ботом"},
-    {"command": "help", "description": "❓ Получить справку"},
-]
+BOT_COMMANDS: Tuple[BotCommand, ...] = (
+    BotCommand(command="start", description="🎉 Начать работу с ботом"),
+    BotCommand(command="help", description="❓ Получить справку"),
+)
+
+@lru_cache(maxsize=64)
+def _cached_fs_input_file(path: str) -> FSInputFile:
+    return FSInputFile(path)
+
+def get_fs_input_file(path: Union[str, Path]) -> FSInputFile:
+    """
+    Получение FSInputFile для пути с переиспользованием уже созданных объектов.
+    
+    FSInputFile открывает файл только при загрузке, поэтому один объект
+    можно безопасно отправлять несколько раз.
+    """
+    return _cached_fs_input_file(os.fspath(path))
+
+@dataclass(frozen=True)
+class BotInfo:
+    """Кэшированная информация о боте (результат get_me)."""
+    __slots__ = (
+        "id", "username", "first_name", "is_bot", "can_join_groups",
+        "can_read_all_group_messages", "supports_inline_queries",
+    )
+    id: int
+    username: Optional[str]
+    first_name: str
+    is_bot: bool
+    can_join_groups: Optional[bool]
+    can_read_all_group_messages: Optional[bool]
+    supports_inline_queries: Optional[bool]
 
 class BotManager:
     """Менеджер бота для управления экземпляром бота и диспетчера."""
     
+    __slots__ = ("bot", "dp", "logger", "_debug", "bot_info", "_bot_id")
+    
     def __init__(self, bot: Bot, dp: Dispatcher):
         """
         Инициализация менеджера бота.
@@ -31,9 +67,11 @@ class BotManager:
         self.bot = bot
         self.dp = dp
         self.logger = get_bot_logger()
+        self._debug = self.logger.isEnabledFor(logging.DEBUG)
         
         # Информация о боте (будет заполнена при запуске)
         self.bot_info = None
+        self._bot_id = None
         
         self.logger.info("🤖 Инициализирован менеджер бота")
         
@@ -42,22 +80,26 @@ class BotManager:
         Настройка команд бота для отображения в меню Telegram.
         """
         try:
-            commands = [
-                BotCommand(command=cmd["command"], description=cmd["description"]) 
-                for cmd in BOT_COMMANDS
-            ]
-            
-            await self.bot.set_my_commands(commands)
-            self.logger.info(f"✅ Настроено {len(commands)} команд бота")
+            await self.bot.set_my_commands(list(BOT_COMMANDS))
+            self.logger.info(f"✅ Настроено {len(BOT_COMMANDS)} команд бота")
             
             # Логируем установленные команды
-            for cmd in commands:
-                self.logger.debug(f"   Command: /{cmd.command} - {cmd.description}")
+            if self._debug:
+                for cmd in BOT_COMMANDS:
+                    self.logger.debug("   Command: /%s - %s", cmd.command, cmd.description)
                 
         except Exception as e:
             self.logger.error(f"❌ Ошибка настройки команд бота: {e}")
             raise
     
+    async def prime(self) -> None:
+        """
+        Подготовка бота при запуске: настройка команд и получение информации о боте.
+        
+        Оба запроса к Telegram независимы и выполняются параллельно.
+        """
+        await asyncio.gather(self.setup_commands(), self._get_bot_info_record())
+    
     async def get_bot_info(self) -> Dict[str, Any]:
         """
         Получение информации о боте.
@@ -65,29 +107,41 @@ class BotManager:
         Returns:
             dict: Информация о боте
         """
+        bot_info = await self._get_bot_info_record()
+        return asdict(bot_info) if bot_info else {}
+    
+    async def _get_bot_info_record(self) -> Optional[BotInfo]:
+        """
+        Получение кэшированной записи с информацией о боте.
+        
+        Returns:
+            BotInfo: Информация о боте или None при ошибке
+        """
         try:
             if self.bot_info is None:
                 me = await self.bot.get_me()
-                self.bot_info = {
-                    "id": me.id,
-                    "username": me.username,
-                    "first_name": me.first_name,
-                    "is_bot": me.is_bot,
-                    "can_join_groups": me.can_join_groups,
-                    "can_read_all_group_messages": me.can_read_all_group_messages,
-                    "supports_inline_queries": me.supports_inline_queries
-                }
+                self.bot_info = BotInfo(
+                    id=me.id,
+                    username=me.username,
+                    first_name=me.first_name,
+                    is_bot=me.is_bot,
+                    can_join_groups=me.can_join_groups,
+                    can_read_all_group_messages=me.can_read_all_group_messages,
+                    supports_inline_queries=me.supports_inline_queries
+                )
+                self._bot_id = me.id
                 
                 self.logger.info(f"📋 Информация о боте получена: @{me.username}")
-                self.logger.debug(f"   ID: {me.id}")
-                self.logger.debug(f"   Имя: {me.first_name}")
-                self.logger.debug(f"   Может работать в группах: {me.can_join_groups}")
+                if self._debug:
+                    self.logger.debug("   ID: %s", me.id)
+                    self.logger.debug("   Имя: %s", me.first_name)
+                    self.logger.debug("   Может работать в группах: %s", me.can_join_groups)
             
             return self.bot_info
             
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения информации о боте: {e}")
-            return {}
+            return None
     
     async def send_message_safe(self, chat_id: int, text: str, **kwargs) -> bool:
         """
@@ -103,7 +157,8 @@ class BotManager:
         """
         try:
             await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
-            self.logger.debug(f"✅ Сообщение отправлено в чат {chat_id}")
+            if self._debug:
+                self.logger.debug("✅ Сообщение отправлено в чат %s", chat_id)
             return True
         except Exception as e:
             self.logger.error(f"❌ Ошибка отправки сообщения в чат {chat_id}: {e}")
@@ -114,6 +169,9 @@ class BotManager:
         """
         Безопасная отправка фото с обработкой ошибок.
         
+        Тонкая обертка над send_photo_by_path / send_photo_by_file:
+        вызывающий код, который уже знает тип фото, может вызывать их напрямую.
+        
         Args:
             chat_id: ID чата
             photo: Фото для отправки (путь к файлу, Path или FSInputFile)
@@ -123,37 +181,76 @@ class BotManager:
         Returns:
             bool: True если фото отправлено успешно
         """
-        try:
-            # Если передан путь к файлу, конвертируем в FSInputFile
-            if isinstance(photo, (str, Path)):
-                photo_path = Path(photo)
-                if not photo_path.exists():
-                    self.logger.error(f"❌ Файл фото не найден: {photo_path}")
-                    return False
-                photo = FSInputFile(photo_path)
+        if isinstance(photo, (str, Path)):
+            return await self.send_photo_by_path(chat_id, photo, caption, **kwargs)
+        return await self.send_photo_by_file(chat_id, photo, caption, **kwargs)
+    
+    async def send_photo_by_path(self, chat_id: int, photo_path: Union[str, Path],
+                                 caption: str = None, **kwargs) -> bool:
+        """
+        Безопасная отправка фото по пути к файлу.
+        
+        Args:
+            chat_id: ID чата
+            photo_path: Путь к файлу фото
+            caption: Подпись к фото
+            **kwargs: Дополнительные параметры
             
+        Returns:
+            bool: True если фото отправлено успешно
+        """
+        return await self.send_photo_by_file(chat_id, get_fs_input_file(photo_path), caption, **kwargs)
+    
+    async def send_photo_by_file(self, chat_id: int, photo: FSInputFile,
+                                 caption: str = None, **kwargs) -> bool:
+        """
+        Безопасная отправка уже подготовленного FSInputFile.
+        
+        Существование файла не проверяется заранее: aiogram сам открывает
+        файл при загрузке, а отсутствие файла обрабатывается как ошибка.
+        
+        Args:
+            chat_id: ID чата
+            photo: Файл фото
+            caption: Подпись к фото
+            **kwargs: Дополнительные параметры
+            
+        Returns:
+            bool: True если фото отправлено успешно
+        """
+        try:
             await self.bot.send_photo(chat_id=chat_id, photo=photo, caption=caption, **kwargs)
-            self.logger.debug(f"✅ Фото отправлено в чат {chat_id}")
+            if self._debug:
+                self.logger.debug("✅ Фото отправлено в чат %s", chat_id)
             return True
+        except FileNotFoundError:
+            self.logger.error(f"❌ Файл фото не найден: {photo.path}")
+            return False
         except Exception as e:
             self.logger.error(f"❌ Ошибка отправки фото в чат {chat_id}: {e}")
             return False
     
-    async def download_file_safe(self, file_id: str, destination: Union[str, Path]) -> bool:
+    async def download_file_safe(self, file_id: str, destination: Union[str, Path],
+                                 chunk_size: int = 65536) -> bool:
         """
         Безопасное скачивание файла с обработкой ошибок.
         
+        Файл пишется на диск по частям прямо из HTTP ответа, без буферизации
+        целиком в памяти (aiogram стримит в файл, если передан путь).
+        
         Args:
             file_id: ID файла для скачивания
             destination: Путь для сохранения файла
+            chunk_size: Размер блока записи в байтах
             
         Returns:
             bool: True если файл скачан успешно
         """
         try:
             file = await self.bot.get_file(file_id)
-            await self.bot.download_file(file.file_path, destination)
-            self.logger.debug(f"✅ Файл {file_id} скачан в {destination}")
+            await self.bot.download_file(file.file_path, destination=destination, chunk_size=chunk_size)
+            if self._debug:
+                self.logger.debug("✅ Файл %s скачан в %s", file_id, destination)
             return True
         except Exception as e:
             self.logger.error(f"❌ Ошибка скачивания файла {file_id}: {e}")
@@ -169,12 +266,10 @@ class BotManager:
         Returns:
             str: Строковое представление пользователя
         """
-        username = f"@{user.username}" if user.username else "без username"
-        full_name = f"{user.first_name}"
-        if user.last_name:
-            full_name += f" {user.last_name}"
-        
-        return f"{full_name} ({username}, ID: {user.id})"
+        return (
+            f"{user.first_name}{' ' + user.last_name if user.last_name else ''} "
+            f"({'@' + user.username if user.username else 'без username'}, ID: {user.id})"
+        )
     
     async def log_user_interaction(self, user, message_type: str, content_preview: str = ""):
         """
@@ -185,15 +280,20 @@ class BotManager:
             message_type: Тип сообщения
             content_preview: Превью содержимого
         """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        
         user_info = self.get_user_info_string(user)
         
-        log_message = f"USER_INTERACTION | {user_info} | TYPE: {message_type}"
         if content_preview:
-            # Обрезаем превью до 100 символов
-            preview = content_preview[:100] + "..." if len(content_preview) > 100 else content_preview
-            log_message += f" | PREVIEW: {preview}"
-        
-        self.logger.info(log_message)
+            # Превью обрезается до 100 символов самим форматтером (%.100s)
+            self.logger.info(
+                "USER_INTERACTION | %s | TYPE: %s | PREVIEW: %.100s%s",
+                user_info, message_type, content_preview,
+                "..." if len(content_preview) > 100 else ""
+            )
+        else:
+            self.logger.info("USER_INTERACTION | %s | TYPE: %s", user_info, message_type)
     
     async def get_chat_member_count(self, chat_id: int) -> int:
         """
@@ -207,7 +307,8 @@ class BotManager:
         """
         try:
             count = await self.bot.get_chat_member_count(chat_id)
-            self.logger.debug(f"Количество участников в чате {chat_id}: {count}")
+            if self._debug:
+                self.logger.debug("Количество участников в чате %s: %s", chat_id, count)
             return count
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения количества участников чата {chat_id}: {e}")
@@ -224,18 +325,35 @@ class BotManager:
             dict: Словарь с разрешениями бота
         """
         try:
-            me = await self.bot.get_me()
-            chat_member: ChatMember = await self.bot.get_chat_member(chat_id, me.id)
+            # ID бота берем из кэша, чтобы не делать лишний запрос get_me
+            if self._bot_id is None:
+                await self._get_bot_info_record()
+            if self._bot_id is None:
+                raise RuntimeError("Не удалось получить ID бота")
             
-            permissions = {
-                "status": chat_member.status,
-                "can_send_messages": getattr(chat_member, "can_send_messages", True),
-                "can_send_media_messages": getattr(chat_member, "can_send_media_messages", True),
-                "can_send_other_messages": getattr(chat_member, "can_send_other_messages", True),
-                "can_add_web_page_previews": getattr(chat_member, "can_add_web_page_previews", True),
-            }
+            chat_member: ChatMember = await self.bot.get_chat_member(chat_id, self._bot_id)
+            
+            # Флаги ограничений есть только у ChatMemberRestricted,
+            # для остальных статусов ограничений нет
+            if isinstance(chat_member, ChatMemberRestricted):
+                permissions = {
+                    "status": chat_member.status,
+                    "can_send_messages": chat_member.can_send_messages,
+                    "can_send_media_messages": getattr(chat_member, "can_send_media_messages", True),
+                    "can_send_other_messages": chat_member.can_send_other_messages,
+                    "can_add_web_page_previews": chat_member.can_add_web_page_previews,
+                }
+            else:
+                permissions = {
+                    "status": chat_member.status,
+                    "can_send_messages": True,
+                    "can_send_media_messages": True,
+                    "can_send_other_messages": True,
+                    "can_add_web_page_previews": True,
+                }
             
-            self.logger.debug(f"Разрешения бота в чате {chat_id}: {permissions}")
+            if self._debug:
+                self.logger.debug("Разрешения бота в чате %s: %s", chat_id, permissions)
             return permissions
         except Exception as e:
             self.logger.error(f"❌ Ошибка проверки разрешений в чате {chat_id}: {e}")
@@ -257,14 +375,15 @@ class BotManager:
             chat_info = {
                 "id": chat.id,
                 "type": chat.type,
-                "title": getattr(chat, "title", None),
-                "username": getattr(chat, "username", None),
-                "first_name": getattr(chat, "first_name", None),
-                "last_name": getattr(chat, "last_name", None),
-                "description": getattr(chat, "description", None),
+                "title": chat.title,
+                "username": chat.username,
+                "first_name": chat.first_name,
+                "last_name": chat.last_name,
+                "description": chat.description,
             }
             
-            self.logger.debug(f"Информация о чате {chat_id}: {chat_info}")
+            if self._debug:
+                self.logger.debug("Информация о чате %s: %s", chat_id, chat_info)
             return chat_info
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения информации о чате {chat_id}: {e}")
@@ -341,7 +460,8 @@ class BotManager:
                 "file_path": file.file_path,
             }
             
-            self.logger.debug(f"Информация о файле {file_id}: {file_info}")
+            if self._debug:
+                self.logger.debug("Информация о файле %s: %s", file_id, file_info)
             return file_info
         except Exception as e:
             self.logger.error(f"❌ Ошибка получения информации о файле {file_id}: {e}")
@@ -360,7 +480,8 @@ class BotManager:
         """
         try:
             await self.bot.delete_message(chat_id=chat_id, message_id=message_id)
-            self.logger.debug(f"✅ Сообщение {message_id} удалено из чата {chat_id}")
+            if self._debug:
+                self.logger.debug("✅ Сообщение %s удалено из чата %s", message_id, chat_id)
             return True
         except Exception as e:
             self.logger.error(f"❌ Ошибка удаления сообщения {message_id} из чата {chat_id}: {e}")
@@ -386,7 +507,8 @@ class BotManager:
                 text=text,
                 **kwargs
             )
-            self.logger.debug(f"✅ Сообщение {message_id} отредактировано в чате {chat_id}")
+            if self._debug:
+                self.logger.debug("✅ Сообщение %s отредактировано в чате %s", message_id, chat_id)
             return True
         except Exception as e:
             self.logger.error(f"❌ Ошибка редактирования сообщения {message_id} в чате {chat_id}: {e}")
@@ -400,12 +522,12 @@ class BotManager:
             dict: Статус бота и диспетчера
         """
         try:
-            bot_info = await self.get_bot_info()
+            bot_info = await self._get_bot_info_record()
             
             return {
-                "bot_connected": bool(bot_info),
-                "bot_username": bot_info.get("username", "unknown"),
-                "bot_id": bot_info.get("id", "unknown"),
+                "bot_connected": bot_info is not None,
+                "bot_username": bot_info.username if bot_info else "unknown",
+                "bot_id": bot_info.id if bot_info else "unknown",
                 "dispatcher_running": self.dp is not None,
                 "commands_count": len(BOT_COMMANDS)
             }
@@ -430,6 +552,7 @@ class BotManager:
             
             # Очищаем кэш информации о боте
             self.bot_info = None
+            self._bot_id = None
             
             self.logger.info("✅ Ресурсы бота очищены")
         except Exception as e:
@@ -438,7 +561,7 @@ class BotManager:
     def __str__(self) -> str:
         """Строковое представление менеджера бота."""
         if self.bot_info:
-            return f"BotManager(@{self.bot_info.get('username', 'unknown')})"
+            return f"BotManager(@{self.bot_info.username or 'unknown'})"
         return "BotManager(not_initialized)"
     
     def __repr__(self) -> str:
@@ -4,17 +4,22 @@
 """
 
 import asyncio
+import html
+import logging
 import time
 import shutil
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, List
-import re
+from typing import List, Optional, Union
 
 from aiogram import Dispatcher, F
 from aiogram.filters import Command
 from aiogram.types import Message, Voice, InputMediaPhoto
-from aiogram.types import FSInputFile
+from aiogram.types import FSInputFile, BufferedInputFile, InputFile
 from aiogram.fsm.context import FSMContext
+from aiogram.utils.chat_action import ChatActionMiddleware
 
 from src.utils.config import config, BOT_MESSAGES
 from src.utils.logger import get_handlers_logger
@@ -24,91 +29,308 @@ from src.image.generator import ImageGenerator
 # Инициализация логгера
 logger = get_handlers_logger()
 
-# Инициализация модулей (будут созданы при первом использовании)
-speech_processor = None
-image_generator = None
+# Фоновые задачи (очистка и т.п.), запущенные без ожидания
+_background_tasks = set()
 
-# Исключение для случая когда все GPU заняты
-class AllGPUsBusyError(Exception):
-    """Исключение когда все GPU заняты и очередь переполнена."""
-    pass
+# Минимальный интервал между редактированиями сообщения о прогрессе (секунды)
+PROGRESS_EDIT_INTERVAL = 0.5
 
-def get_speech_processor():
-    """Получение экземпляра обработчика речи (lazy initialization)."""
-    global speech_processor
-    if speech_processor is None:
-        try:
-            speech_processor = SpeechToText()
-            logger.info("✅ Модуль распознавания речи инициализирован")
-        except Exception as e:
-            logger.error(f"❌ Ошибка инициализации модуля речи: {e}")
-            speech_processor = None
-    return speech_processor
-
-def get_image_generator():
-    """Получение экземпляра генератора изображений (lazy initialization)."""
-    global image_generator
-    if image_generator is None:
-        try:
-            image_generator = ImageGenerator()
-            logger.info("✅ Модуль генерации изображений инициализирован")
-        except Exception as e:
-            logger.error(f"❌ Ошибка инициализации генератора изображений: {e}")
-            image_generator = None
-    return image_generator
+# Шаблоны прогресса: ключ -> (форматирование, является ли обновление завершающим).
+# Завершающие обновления (этап выполнен, отправка картинок) не откладываются
+PROGRESS_FORMATTERS = {
+    key: (template.format_map, key.endswith("_done") or key == "sending_images")
+    for key, template in BOT_MESSAGES["progress"].items()
+}
+
+# Максимальное количество изображений в одной медиа-группе Telegram
+MEDIA_GROUP_LIMIT = 10
+
+# Максимальный суммарный размер изображений, загружаемых в память один раз
+# для отправки и пользователю, и администратору (байты)
+PRELOAD_IMAGES_MAX_BYTES = 20 * 1024 * 1024
+
+# Ограничение одновременных генераций (создается при первом использовании,
+# чтобы семафор был привязан к работающему event loop)
+_generation_semaphore: Optional[asyncio.Semaphore] = None
+
+# Количество запросов, ожидающих свободного слота генерации
+_queued_generations = 0
+
+# Время последних сообщений каждого пользователя (для rate limiting)
+_message_times = defaultdict(deque)
+
+# Окно rate limiting (секунды)
+RATE_LIMIT_WINDOW = 60.0
+
+# ID пользователей, для которых сейчас идет генерация
+_active_generations = set()
+
+# Недавние результаты: (user_id, нормализованный текст) -> (директория, перевод, таймер удаления).
+# Повторная отправка того же текста (двойное нажатие, повтор клиента) в течение
+# RECENT_RESULT_TTL секунд переотправляет готовые картинки без новой генерации
+_recent_results: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+# Время хранения результата для повторной отправки (секунды)
+RECENT_RESULT_TTL = 60.0
+
+# Максимальное количество хранимых результатов
+RECENT_RESULTS_MAXSIZE = 256
+
+# Тексты длиннее этого значения не запоминаются
+RECENT_RESULT_MAX_TEXT_LENGTH = 1000
+
+# Типы неподдерживаемого контента (значения Message.content_type)
+UNSUPPORTED_CONTENT_TYPES = frozenset({
+    "photo",
+    "video",
+    "document",
+    "sticker",
+    "animation",
+    "video_note",
+    "location",
+    "contact",
+})
+
+# Фильтр неподдерживаемого контента: одна проверка content_type по множеству
+UNSUPPORTED_CONTENT_FILTER = F.content_type.in_(UNSUPPORTED_CONTENT_TYPES)
+
+# Максимальная длина текста в подписи для администратора
+ADMIN_CAPTION_TEXT_LIMIT = 500
+
+# Таблица экранирования спецсимволов MarkdownV2 (для str.translate)
+MARKDOWN_V2_ESCAPE = str.maketrans({char: "\\" + char for char in "_*[]()~`>#+-=|{}.!\\"})
+
+@lru_cache(maxsize=1)
+def get_speech_processor() -> Optional[SpeechToText]:
+    """
+    Получение экземпляра обработчика речи (lazy initialization).
+    
+    Экземпляр создается один раз; при ошибке инициализации кэшируется None,
+    и повторные попытки не выполняются.
+    """
+    try:
+        speech_processor = SpeechToText()
+        logger.info("✅ Модуль распознавания речи инициализирован")
+        return speech_processor
+    except Exception as e:
+        logger.error(f"❌ Ошибка инициализации модуля речи: {e}")
+        return None
+
+@lru_cache(maxsize=1)
+def get_image_generator() -> Optional[ImageGenerator]:
+    """
+    Получение экземпляра генератора изображений (lazy initialization).
+    
+    Экземпляр создается один раз; при ошибке инициализации кэшируется None,
+    и повторные попытки не выполняются.
+    """
+    try:
+        image_generator = ImageGenerator()
+        logger.info("✅ Модуль генерации изображений инициализирован")
+        return image_generator
+    except Exception as e:
+        logger.error(f"❌ Ошибка инициализации генератора изображений: {e}")
+        return None
+
+def start_model_warmup() -> List[asyncio.Task]:
+    """
+    Фоновая загрузка моделей при запуске бота (diffusion.preload_model).
+    
+    Сервисы создаются сразу, а модели загружаются в пулы в фоне, поэтому
+    первый пользователь не ждет загрузку с нуля. Если сообщение придет
+    во время загрузки, initialize() пула дождется ее завершения.
+    
+    Returns:
+        List[asyncio.Task]: Запущенные задачи загрузки
+    """
+    tasks = []
+    
+    generator = get_image_generator()
+    if generator:
+        tasks.append(run_in_background(generator.gpu_pool.initialize()))
+        tasks.append(run_in_background(generator.translator_pool.initialize()))
+    
+    speech_processor = get_speech_processor()
+    if speech_processor:
+        tasks.append(run_in_background(speech_processor.whisper_pool.initialize()))
+    
+    logger.info(f"🔥 Запущен фоновый прогрев моделей ({len(tasks)} пулов)")
+    return tasks
+
+def get_generation_semaphore(generator: ImageGenerator) -> asyncio.Semaphore:
+    """
+    Получение семафора, ограничивающего число одновременных генераций.
+    
+    Лимит берется из config.diffusion.max_concurrent_generations,
+    а при значении 0 равен числу устройств в GPU пуле, умноженному
+    на размер батча (config.diffusion.max_batch_size).
+    """
+    global _generation_semaphore
+    if _generation_semaphore is None:
+        limit = config.diffusion.max_concurrent_generations or (
+            len(generator.gpu_pool.gpu_devices) * max(config.diffusion.max_batch_size, 1)
+        )
+        _generation_semaphore = asyncio.Semaphore(max(limit, 1))
+        logger.info(f"🚦 Лимит одновременных генераций: {max(limit, 1)}")
+    return _generation_semaphore
+
+@asynccontextmanager
+async def generation_slot(generator: ImageGenerator, message: Optional[Message] = None):
+    """
+    Получение слота генерации с ограничением очереди и времени ожидания.
+    
+    Args:
+        generator: Генератор изображений
+        message: Сообщение пользователя для уведомления о позиции в очереди
+            (отправляется только запросу, который действительно встал в очередь)
+    
+    Raises:
+        asyncio.QueueFull: В очереди уже max_queue_size запросов
+        asyncio.TimeoutError: Слот не освободился за max_queue_wait секунд
+    """
+    global _queued_generations
+    semaphore = get_generation_semaphore(generator)
+    
+    if semaphore.locked() and _queued_generations >= config.diffusion.max_queue_size:
+        raise asyncio.QueueFull()
+    
+    # Запрос, не дождавшийся слота, снимается с очереди и не занимает GPU
+    _queued_generations += 1
+    queue_position = _queued_generations
+    try:
+        if message is not None:
+            await notify_queue_position(message, generator, queue_position)
+        await asyncio.wait_for(semaphore.acquire(), timeout=config.diffusion.max_queue_wait or None)
+    finally:
+        _queued_generations -= 1
+    
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+async def notify_queue_position(message: Message, generator: ImageGenerator, queue_position: int) -> None:
+    """
+    Сообщение о позиции в очереди, если все GPU или переводчики заняты.
+    
+    Args:
+        message: Сообщение пользователя
+        generator: Генератор изображений
+        queue_position: Позиция запроса в очереди generation_slot
+    """
+    gpu_status = generator.gpu_pool.get_status()
+    translator_status = generator.translator_pool.get_status()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🎮 GPU статус: %s", gpu_status)
+        logger.debug("🔤 Переводчик статус: %s", translator_status)
+    
+    if gpu_status["available_gpus"] == 0 or translator_status["available_devices"] == 0:
+        total_busy = gpu_status["busy_gpus"] + translator_status["busy_devices"]
+        total_devices = gpu_status["total_gpus"] + translator_status["total_devices"]
+        await message.answer(
+            f"⏳ Обработка запросов. Ваша позиция в очереди: {queue_position}\n"
+            f"Занято устройств: {total_busy}/{total_devices} (GPU + переводчики)"
+        )
+
+def as_input_file(photo: Union[str, InputFile]) -> InputFile:
+    """
+    Приведение изображения к InputFile.
+    
+    FSInputFile только запоминает путь, файл читается асинхронно
+    во время отправки, поэтому создание не блокирует event loop.
+    """
+    return photo if isinstance(photo, InputFile) else FSInputFile(photo)
 
-async def send_to_admin(bot, images_dir: str, user_message: Message, original_text: str, is_voice: bool = False, content: str = None) -> None:
+def make_media_photo(photo: Union[str, InputFile], caption: Optional[str] = None,
+                     parse_mode: Optional[str] = None) -> InputMediaPhoto:
+    """
+    Создание элемента медиа-группы для изображения.
+    
+    Args:
+        photo: Путь к изображению или уже подготовленный InputFile
+        caption: Подпись (только для первого элемента группы)
+        parse_mode: Режим разметки подписи
+        
+    Returns:
+        InputMediaPhoto: Элемент медиа-группы
+    """
+    return InputMediaPhoto(
+        media=as_input_file(photo),
+        caption=caption,
+        parse_mode=parse_mode if caption else None
+    )
+
+def load_image_files(image_paths: List[str]) -> List[InputFile]:
+    """
+    Загрузка изображений в память для повторной отправки без чтения с диска.
+    
+    Блокирующая функция (запускается в потоке). Если изображения в сумме
+    больше PRELOAD_IMAGES_MAX_BYTES, возвращаются FSInputFile.
+    
+    Args:
+        image_paths: Пути к изображениям
+        
+    Returns:
+        List[InputFile]: Файлы для отправки
+    """
+    paths = [Path(image_path) for image_path in image_paths]
+    if sum(path.stat().st_size for path in paths) > PRELOAD_IMAGES_MAX_BYTES:
+        return [FSInputFile(path) for path in paths]
+    return [BufferedInputFile(path.read_bytes(), filename=path.name) for path in paths]
+
+def build_admin_caption(user_message: Message, original_text: str, content: Optional[str]) -> str:
+    """
+    Формирование подписи для копии администратору (MarkdownV2).
+    
+    Args:
+        user_message: Исходное сообщение пользователя
+        original_text: Текст поздравления
+        content: Перевод текста (может отсутствовать)
+        
+    Returns:
+        str: Подпись с экранированными спецсимволами
+    """
+    user = user_message.from_user
+    username = f"@{user.username}" if user.username else "без username"
+    
+    def spoiler(text: str) -> str:
+        ellipsis = "\\.\\.\\." if len(text) > ADMIN_CAPTION_TEXT_LIMIT else ""
+        return f"||{text[:ADMIN_CAPTION_TEXT_LIMIT].translate(MARKDOWN_V2_ESCAPE)}{ellipsis}||"
+    
+    caption = (
+        f"👤 *Пользователь:* ||{username.translate(MARKDOWN_V2_ESCAPE)}||\n"
+        f"💬 *Текст:*\n"
+        f"{spoiler(original_text)}"
+    )
+    if content:
+        caption += f"\n💬 *Перевод:*\n{spoiler(content)}"
+    return caption
+
+async def send_to_admin(bot, image_paths: List[Union[str, InputFile]], user_message: Message, original_text: str,
+                        is_voice: bool = False, content: str = None) -> None:
     """
     Отправка копии результата администратору.
     
     Args:
         bot: Экземпляр бота
-        images_dir: Путь к директории с изображениями
+        image_paths: Изображения для отправки (пути или подготовленные файлы, не пустой список)
         user_message: Исходное сообщение пользователя
         original_text: Текст поздравления
         is_voice: True если исходное сообщение было голосовым
+        content: Перевод текста, использованный для генерации
     """
     if not config.bot.admin_user_id:
         logger.debug("🔇 Admin ID не настроен, пропускаем отправку администратору")
         return
     
     try:
-        user_info = user_message.from_user
-        user_name = user_info.full_name
-        username = f"@{user_info.username}" if user_info.username else "без username"
-        
-        # Формируем заголовок для администратора
-        def escape_md(text: str) -> str:
-            return re.sub(r'([_*\[\]()~`>#+\-=|{}.!\\])', r'\\\1', text)
-
-        username_safe = escape_md(username)
-        original_text_safe = escape_md(original_text[:500])
-        content_safe = escape_md(content[:500])
-        admin_caption = (
-            f"👤 *Пользователь:* ||{username_safe}||\n"
-            f"💬 *Текст:*\n"
-            f"||{original_text_safe}{'...' if len(original_text) > 500 else ''}||"
-            f"💬 *Перевод:*\n"
-            f"||{content_safe}{'...' if len(content) > 500 else ''}||"
-        )
-
-        # Получаем пути ко всем изображениям
-        generator = get_image_generator()
-        if not generator:
-            logger.error("❌ Генератор изображений недоступен для отправки администратору")
-            return
-            
-        image_paths = generator.get_image_paths_from_dir(images_dir)
-        
-        if not image_paths:
-            logger.error(f"❌ Не найдено изображений для отправки администратору: {images_dir}")
-            return
+        admin_caption = build_admin_caption(user_message, original_text, content)
         
         logger.info(f"📤 Отправка копии администратору (ID: {config.bot.admin_user_id})")
         
         # Если одно изображение - отправляем как обычное фото
         if len(image_paths) == 1:
-            photo = FSInputFile(image_paths[0])
+            photo = as_input_file(image_paths[0])
             await bot.send_photo(
                 chat_id=config.bot.admin_user_id,
                 photo=photo,
@@ -119,18 +341,9 @@ async def send_to_admin(bot, images_dir: str, user_message: Message, original_te
             return
         
         # Если несколько изображений - отправляем как медиа-группу
-        media_group = []
-        for i, image_path in enumerate(image_paths):
-            # Первое изображение с подписью, остальные без
-            caption = admin_caption if i == 0 else None
-            
-            media_group.append(
-                InputMediaPhoto(
-                    media=FSInputFile(image_path),
-                    caption=caption,
-                    parse_mode="MarkdownV2" if caption else None
-                )
-            )
+        # Первое изображение с подписью, остальные без
+        media_group = [make_media_photo(image_paths[0], admin_caption, parse_mode="MarkdownV2")]
+        media_group += [make_media_photo(image_path) for image_path in image_paths[1:]]
         
         # Отправляем медиа-группу
         await bot.send_media_group(
@@ -143,35 +356,49 @@ async def send_to_admin(bot, images_dir: str, user_message: Message, original_te
         logger.error(f"❌ Ошибка отправки копии администратору: {e}")
         # Не прерываем основной процесс из-за ошибки отправки администратору
 
-async def send_media_group_from_directory(message: Message, images_dir: str) -> bool:
+async def send_media_chunk(message: Message, chunk: List[tuple]) -> None:
     """
-    Отправка медиа-группы с изображениями из директории.
+    Отправка одной медиа-группы (не более MEDIA_GROUP_LIMIT изображений).
+    
+    Если Telegram отклоняет медиа-группу, изображения отправляются
+    по отдельности параллельно.
     
     Args:
         message: Сообщение пользователя для ответа
-        images_dir: Путь к директории с изображениями
+        chunk: Список пар (изображение, подпись или None)
+    """
+    # Медиа-группа должна содержать минимум 2 элемента
+    if len(chunk) > 1:
+        try:
+            await message.answer_media_group(media=[
+                make_media_photo(photo, caption) for photo, caption in chunk
+            ])
+            return
+        except Exception as e:
+            logger.warning(f"⚠️ Медиа-группа отклонена, отправляем по одному: {e}")
+    
+    await asyncio.gather(*(
+        message.answer_photo(photo=as_input_file(photo), caption=caption)
+        for photo, caption in chunk
+    ))
+
+async def send_media_group_from_directory(message: Message, image_paths: List[Union[str, InputFile]]) -> bool:
+    """
+    Отправка пользователю изображений из директории с результатом.
+    
+    Args:
+        message: Сообщение пользователя для ответа
+        image_paths: Изображения для отправки (пути или подготовленные файлы, не пустой список)
         
     Returns:
         bool: True если изображения отправлены успешно
     """
     try:
-        generator = get_image_generator()
-        if not generator:
-            logger.error("❌ Генератор изображений недоступен")
-            return False
-            
-        # Получаем пути ко всем изображениям
-        image_paths = generator.get_image_paths_from_dir(images_dir)
-        
-        if not image_paths:
-            logger.error(f"❌ Не найдено изображений в директории: {images_dir}")
-            return False
-        
         logger.info(f"📤 Отправка {len(image_paths)} изображений")
         
         # Если одно изображение - отправляем как обычное фото
         if len(image_paths) == 1:
-            photo = FSInputFile(image_paths[0])
+            photo = as_input_file(image_paths[0])
             await message.answer_photo(
                 photo=photo,
                 caption="🎉 Ваша поздравительная картинка готова!"
@@ -179,21 +406,24 @@ async def send_media_group_from_directory(message: Message, images_dir: str) ->
             logger.info("✅ Отправлено одно изображение")
             return True
         
-        # Если несколько изображений - отправляем как медиа-группу
-        media_group = []
-        for i, image_path in enumerate(image_paths):
-            # Первое изображение с подписью, остальные без
-            caption = "🎉 Ваши поздравительные картинки готовы!" if i == 0 else None
-            
-            media_group.append(
-                InputMediaPhoto(
-                    media=FSInputFile(image_path),
-                    caption=caption
-                )
-            )
+        # Если несколько изображений - отправляем медиа-группами по MEDIA_GROUP_LIMIT,
+        # все группы уходят параллельно. Подпись только у первого изображения
+        captions = ["🎉 Ваши поздравительные картинки готовы!"] + [None] * (len(image_paths) - 1)
+        chunks = [
+            list(zip(image_paths[i:i + MEDIA_GROUP_LIMIT], captions[i:i + MEDIA_GROUP_LIMIT]))
+            for i in range(0, len(image_paths), MEDIA_GROUP_LIMIT)
+        ]
+        
+        results = await asyncio.gather(
+            *(send_media_chunk(message, chunk) for chunk in chunks),
+            return_exceptions=True
+        )
+        
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            logger.error(f"❌ Не удалось отправить {len(errors)} из {len(chunks)} медиа-групп: {errors[0]}")
+            return False
         
-        # Отправляем медиа-группу
-        await message.answer_media_group(media=media_group)
         logger.info(f"✅ Отправлена медиа-группа из {len(image_paths)} изображений")
         return True
         
@@ -201,75 +431,237 @@ async def send_media_group_from_directory(message: Message, images_dir: str) ->
         logger.error(f"❌ Ошибка отправки медиа-группы: {e}")
         return False
 
-async def create_progress_callback(message: Message):
-    """Создание callback функции для отправки сообщений о прогрессе."""
-    progress_messages = {}
+class ProgressReporter:
+    """
+    Отображение прогресса одного запроса.
     
-    async def progress_callback(message_key: str, **kwargs):
+    Весь прогресс запроса показывается в одном сообщении, которое редактируется
+    при каждом обновлении. Промежуточные обновления чаще PROGRESS_EDIT_INTERVAL
+    объединяются (показывается последнее), завершающие отправляются сразу.
+    Экземпляр создается на каждый запрос и передается в генератор аргументом.
+    """
+    
+    __slots__ = ("message", "bot", "chat_id", "loop", "lock",
+                 "message_id", "last_update", "pending_text", "flush_handle")
+    
+    def __init__(self, message: Message):
+        """
+        Args:
+            message: Сообщение пользователя, в чат которого выводится прогресс
+        """
+        self.message = message
+        self.bot = message.bot
+        self.chat_id = message.chat.id
+        self.loop = asyncio.get_running_loop()
+        self.lock = asyncio.Lock()
+        self.message_id: Optional[int] = None                      # ID сообщения с прогрессом
+        self.last_update: float = 0.0                              # Время последнего обновления (loop.time())
+        self.pending_text: Optional[str] = None                    # Отложенный текст для объединенного обновления
+        self.flush_handle: Optional[asyncio.TimerHandle] = None    # Запланированная отправка отложенного текста
+    
+    async def _show(self, progress_text: str):
+        """Отправка или редактирование сообщения с прогрессом (под lock)."""
+        if self.message_id is not None:
+            try:
+                await self.bot.edit_message_text(
+                    chat_id=self.chat_id,
+                    message_id=self.message_id,
+                    text=progress_text,
+                    parse_mode="HTML"
+                )
+                self.last_update = self.loop.time()
+                return
+            except Exception as e:
+                logger.debug("Не удалось отредактировать сообщение о прогрессе: %s", e)
+        
+        progress_msg = await self.message.answer(progress_text, parse_mode="HTML")
+        self.message_id = progress_msg.message_id
+        self.last_update = self.loop.time()
+    
+    async def _flush(self):
+        """Отправка отложенного обновления."""
         try:
-            progress_text = BOT_MESSAGES["progress"][message_key].format(**kwargs)
+            async with self.lock:
+                self.flush_handle = None
+                progress_text, self.pending_text = self.pending_text, None
+                if progress_text is not None:
+                    await self._show(progress_text)
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка отправки сообщения о прогрессе: {e}")
+    
+    def _schedule_flush(self):
+        """Запуск отправки отложенного обновления (из call_later)."""
+        run_in_background(self._flush())
+    
+    async def report(self, message_key: str, **kwargs):
+        """
+        Показ сообщения о прогрессе.
+        
+        Args:
+            message_key: Ключ шаблона в BOT_MESSAGES["progress"]
+            **kwargs: Параметры шаблона
+        """
+        try:
+            format_progress, is_final = PROGRESS_FORMATTERS[message_key]
+            progress_text = format_progress(kwargs)
+            delay = PROGRESS_EDIT_INTERVAL - (self.loop.time() - self.last_update)
             
-            if message_key.endswith("_start"):
-                progress_msg = await message.answer(progress_text, parse_mode="HTML")
-                progress_messages[message_key] = progress_msg.message_id
+            # Слишком частое промежуточное обновление - откладываем
+            if self.message_id is not None and not is_final and delay > 0:
+                self.pending_text = progress_text
+                if self.flush_handle is None:
+                    self.flush_handle = self.loop.call_later(delay, self._schedule_flush)
+                return
             
-            elif message_key.endswith("_done"):
-                start_key = message_key.replace("_done", "_start")
-                if start_key in progress_messages:
-                    try:
-                        await message.bot.answer(
-                            text=progress_text,
-                            parse_mode="HTML"
-                        )
-                    except Exception as e:
-                        logger.debug(f"Не удалось отредактировать сообщение: {e}")
-                        await message.answer(progress_text, parse_mode="HTML")
-            else:
-                await message.answer(progress_text, parse_mode="HTML")
+            # Отложенный текст устарел - показываем текущий
+            self.pending_text = None
+            if self.flush_handle is not None:
+                self.flush_handle.cancel()
+                self.flush_handle = None
+            
+            async with self.lock:
+                await self._show(progress_text)
                 
         except Exception as e:
             logger.warning(f"⚠️ Ошибка отправки сообщения о прогрессе: {e}")
-    
-    return progress_callback
+
+# Множители ожидаемого времени распознавания по (устройство, модель)
+SPEECH_TIME_MULTIPLIERS = {
+    ("cuda", "tiny"): 0.01,
+    ("cuda", "base"): 0.05,
+    ("cuda", "small"): 0.1,
+    ("cuda", "medium"): 0.2,
+    ("cuda", "large"): 0.3,
+    ("cpu", "tiny"): 0.1,
+    ("cpu", "base"): 0.2,
+    ("cpu", "small"): 0.3,
+    ("cpu", "medium"): 0.7,
+    ("cpu", "large"): 1.0,
+}
 
 def get_expected_speech_time(duration_seconds: int) -> int:
     """Получение ожидаемого времени распознавания речи."""
-    model_name = config.speech.model_name
-    device = config.speech.device
-    
-    if device == "cuda":
-        base_multiplier = {
-            "tiny": 0.01,
-            "base": 0.05, 
-            "small": 0.1,
-            "medium": 0.2,
-            "large": 0.3
-        }
-    else:  # CPU
-        base_multiplier = {
-            "tiny": 0.1,
-            "base": 0.2,
-            "small": 0.3,
-            "medium": 0.7,
-            "large": 1.0
-        }
-    
-    multiplier = base_multiplier.get(model_name, 1.0)
+    device = "cuda" if config.speech.device == "cuda" else "cpu"
+    multiplier = SPEECH_TIME_MULTIPLIERS.get((device, config.speech.model_name), 1.0)
     expected_time = int((duration_seconds + 1) * multiplier)
     
     return max(expected_time, 3)
 
-def cleanup_images_directory(images_dir: str) -> None:
-    """Очистка директории с изображениями."""
-    try:
-        dir_path = Path(images_dir)
-        if dir_path.exists() and dir_path.is_dir():
-            shutil.rmtree(dir_path)
-            logger.debug(f"🗑️ Удалена директория: {images_dir}")
-    except Exception as e:
-        logger.warning(f"⚠️ Не удалось удалить директорию {images_dir}: {e}")
+def cleanup_images_directory(images_dir: Path) -> Optional[asyncio.Task]:
+    """
+    Фоновая очистка директории с изображениями.
+    
+    Удаление выполняется в отдельном потоке, результат логируется
+    по завершении задачи. Удаляются только директории внутри temp_images.
+    
+    Args:
+        images_dir: Путь к директории с изображениями
+        
+    Returns:
+        Optional[asyncio.Task]: Задача удаления или None, если путь вне temp_images
+    """
+    temp_root = Path(config.paths.temp_images).absolute()
+    if not images_dir.absolute().is_relative_to(temp_root):
+        logger.warning(f"⚠️ Отказ в удалении директории вне {temp_root}: {images_dir}")
+        return None
+    
+    def log_result(task: asyncio.Task) -> None:
+        error = None if task.cancelled() else task.exception()
+        if error is None:
+            logger.debug("🗑️ Удалена директория: %s", images_dir)
+        elif not isinstance(error, FileNotFoundError):
+            logger.warning(f"⚠️ Не удалось удалить директорию {images_dir}: {error}")
+    
+    task = run_in_background(asyncio.to_thread(shutil.rmtree, images_dir))
+    task.add_done_callback(log_result)
+    return task
+
+def recent_result_key(user_id: int, text: str) -> Optional[tuple]:
+    """Ключ недавнего результата или None, если текст не запоминается."""
+    if len(text) > RECENT_RESULT_MAX_TEXT_LENGTH:
+        return None
+    return user_id, " ".join(text.lower().split())
 
-async def handle_generation_request(message: Message, text: str, is_voice: bool = False):
+def take_recent_result(key: Optional[tuple]) -> Optional[tuple]:
+    """
+    Извлечение недавнего результата для повторной отправки.
+    
+    Запись удаляется из кэша, а удаление директории откладывается до повторного
+    remember_recent_result (или выполняется вызывающим кодом).
+    
+    Returns:
+        Optional[tuple]: (директория с изображениями, перевод) или None
+    """
+    if key is None or key not in _recent_results:
+        return None
+    images_dir, content, cleanup_handle = _recent_results.pop(key)
+    cleanup_handle.cancel()
+    return images_dir, content
+
+def expire_recent_result(key: tuple) -> None:
+    """Удаление устаревшего результата и его директории."""
+    entry = _recent_results.pop(key, None)
+    if entry is not None:
+        cleanup_images_directory(entry[0])
+
+def remember_recent_result(key: tuple, images_dir: Path, content: Optional[str]) -> None:
+    """
+    Сохранение отправленного результата на RECENT_RESULT_TTL секунд.
+    
+    Директория удаляется по истечении срока или при вытеснении из кэша.
+    """
+    cleanup_handle = asyncio.get_running_loop().call_later(RECENT_RESULT_TTL, expire_recent_result, key)
+    _recent_results[key] = (images_dir, content, cleanup_handle)
+    
+    while len(_recent_results) > RECENT_RESULTS_MAXSIZE:
+        oldest_key, (_, _, oldest_handle) = next(iter(_recent_results.items()))
+        oldest_handle.cancel()
+        expire_recent_result(oldest_key)
+
+def preview_text(text: str, limit: int) -> str:
+    """Сокращение текста до limit символов для логов."""
+    return text if len(text) <= limit else text[:limit] + "..."
+
+def run_in_background(coro) -> asyncio.Task:
+    """
+    Запуск корутины в фоне без ожидания результата.
+    
+    Ссылка на задачу хранится до ее завершения, иначе сборщик мусора
+    может уничтожить незавершенную задачу.
+    """
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def check_rate_limit(user_id: int) -> bool:
+    """
+    Проверка и учет лимита сообщений пользователя (скользящее окно).
+    
+    Args:
+        user_id: ID пользователя
+        
+    Returns:
+        bool: True если сообщение укладывается в security.rate_limit_messages в минуту
+    """
+    limit = config.security.rate_limit_messages
+    if limit <= 0:
+        return True
+    
+    now = time.monotonic()
+    times = _message_times[user_id]
+    while times and now - times[0] >= RATE_LIMIT_WINDOW:
+        times.popleft()
+    
+    if len(times) >= limit:
+        return False
+    
+    times.append(now)
+    return True
+
+async def handle_generation_request(message: Message, text: str, is_voice: bool = False,
+                                    pending_reply: Optional[asyncio.Task] = None,
+                                    reporter: Optional[ProgressReporter] = None):
     """
     Общий обработчик для генерации изображений с поддержкой multi-GPU.
     
@@ -277,111 +669,117 @@ async def handle_generation_request(message: Message, text: str, is_voice: bool
         message: Сообщение пользователя
         text: Текст для генерации
         is_voice: Было ли исходное сообщение голосовым
+        pending_reply: Уже запущенная отправка ответа пользователю (например,
+            распознанного текста), которая должна завершиться до отправки картинок
+        reporter: Прогресс, уже показанный пользователю (например, при распознавании
+            голоса); если не передан, создается новый
     """
-    start_time = time.time()
+    user = message.from_user
+    user_id = user.id
+    user_name = user.full_name
+    bot = message.bot
+    
+    start_time = time.perf_counter()
     
     try:
-        progress_callback = await create_progress_callback(message)
+        if reporter is None:
+            reporter = ProgressReporter(message)
         
         generator = get_image_generator()
         if not generator:
             await message.answer("❌ Сервис генерации изображений временно недоступен. Попробуйте позже.")
-            logger.error(f"❌ Генератор изображений недоступен для пользователя {message.from_user.full_name}")
+            logger.error(f"❌ Генератор изображений недоступен для пользователя {user_name}")
             return
         
-        generator.progress_callback = progress_callback
-        
-        # Проверяем статус GPU пула
-        gpu_status = generator.gpu_pool.get_status()
-        translator_status = generator.translator_pool.get_status()
-        logger.debug(f"🎮 GPU статус: {gpu_status}")
-        logger.debug(f"🔤 Переводчик статус: {translator_status}")
-        
-        # Если очередь переполнена - уведомляем пользователя
-        if gpu_status["queue_size"] >= config.diffusion.max_queue_size:
-            await message.answer(
-                f"⚠️ Слишком много запросов! Попробуйте через несколько минут.\n"
-                f"Очередь: {gpu_status['queue_size']}/{config.diffusion.max_queue_size}"
-            )
-            logger.warning(f"⚠️ Очередь переполнена для пользователя {message.from_user.full_name}")
+        # Один пользователь - одна генерация одновременно
+        # (до сообщения об очереди, чтобы повторный запрос не получил два ответа)
+        if user_id in _active_generations:
+            await message.answer("⏳ Я еще работаю над вашим предыдущим запросом. Дождитесь результата, пожалуйста.")
+            logger.info(f"⏳ Повторный запрос от пользователя {user_name} во время генерации")
             return
         
-        # Уведомляем о позиции в очереди если есть ожидание
-        total_busy = gpu_status["busy_gpus"] + translator_status["busy_devices"]
-        total_devices = gpu_status["total_gpus"] + translator_status["total_devices"]
-        
-        if gpu_status["available_gpus"] == 0 or translator_status["available_devices"] == 0:
-            queue_position = gpu_status["queue_size"] + 1
-            await message.answer(
-                f"⏳ Обработка запросов. Ваша позиция в очереди: {queue_position}\n"
-                f"Занято устройств: {total_busy}/{total_devices} (GPU + переводчики)"
-            )
+        # Повтор недавнего запроса - переотправляем готовые картинки,
+        # иначе генерируем изображения (может ждать в очереди)
+        result_key = recent_result_key(user_id, text)
+        _active_generations.add(user_id)
+        try:
+            recent_result = take_recent_result(result_key)
+            if recent_result is not None:
+                images_dir, content = recent_result
+                logger.info(f"♻️ Повторный текст от пользователя {user_name}, переотправляем {images_dir}")
+            else:
+                async with generation_slot(generator, message):
+                    images_dir, content = await generator.generate_birthday_image(text, user_id, reporter=reporter)
+        except asyncio.TimeoutError:
+            await message.answer("⌛ Не дождались свободного устройства для генерации. Попробуйте через несколько минут.")
+            logger.warning(f"⌛ Истекло время ожидания в очереди для пользователя {user_name}")
+            return
+        finally:
+            _active_generations.discard(user_id)
         
-        # Генерируем изображения (может ждать в очереди)
-        images_dir, content = await generator.generate_birthday_image(text, message.from_user.id)
+        # Директория сканируется один раз, изображения читаются с диска один раз
+        # и переиспользуются для пользователя и администратора
+        image_paths = []
+        if images_dir:
+            image_paths = await asyncio.to_thread(generator.get_image_paths_from_dir, images_dir)
+            if not image_paths:
+                logger.error(f"❌ Не найдено изображений в директории: {images_dir}")
+                cleanup_images_directory(images_dir)
         
-        if images_dir and Path(images_dir).exists():
-            await progress_callback("sending_images")
+        if image_paths:
+            photos = image_paths
+            if config.bot.admin_user_id:
+                photos = await asyncio.to_thread(load_image_files, image_paths)
             
-            # Отправляем пользователю
-            success = await send_media_group_from_directory(message, images_dir)
+            # Предыдущий ответ должен прийти раньше картинок
+            if pending_reply is not None:
+                await asyncio.gather(pending_reply, return_exceptions=True)
             
-            if success:
-                processing_time = time.time() - start_time
-                logger.info(f"✅ Изображения успешно сгенерированы и отправлены пользователю {message.from_user.full_name} за {processing_time:.2f}с")
-                
-                # Отправляем копию администратору
-                await send_to_admin(
-                    bot=message.bot,
-                    images_dir=images_dir,
+            # Сообщение о прогрессе, отправка картинок пользователю и копии
+            # администратору идут параллельно (send_to_admin не пробрасывает ошибки)
+            _, success, _ = await asyncio.gather(
+                reporter.report("sending_images"),
+                send_media_group_from_directory(message, photos),
+                send_to_admin(
+                    bot=bot,
+                    image_paths=photos,
                     user_message=message,
                     original_text=text,
                     is_voice=is_voice,
                     content=content,
                 )
-                
+            )
+            
+            if success:
                 logger.info(
-                    f"user_id={message.from_user.id},"
-                    f"prompt_length={len(text)},"
-                    f"generation_time={processing_time},"
-                    f"num_images={config.diffusion.num_images},"
-                    f"success={True}"
+                    "✅ Изображения успешно сгенерированы и отправлены пользователю %s за %.2fс",
+                    user_name, time.perf_counter() - start_time
                 )
             else:
                 await message.answer("❌ Не удалось отправить изображения. Попробуйте еще раз.")
-                logger.error(f"❌ Не удалось отправить изображения пользователю {message.from_user.full_name}")
-                
-                processing_time = time.time() - start_time
-                logger.info(
-                    f"user_id={message.from_user.id},"
-                    f"prompt_length={len(text)},"
-                    f"generation_time={processing_time},"
-                    f"num_images={config.diffusion.num_images},"
-                    f"success={False}"
-                )
+                logger.error(f"❌ Не удалось отправить изображения пользователю {user_name}")
             
-            # Удаляем временную директорию
-            cleanup_images_directory(images_dir)
+            # Отправленный результат хранится RECENT_RESULT_TTL секунд для повторов,
+            # остальные временные директории удаляются в фоне, не задерживая ответ
+            if success and result_key is not None:
+                remember_recent_result(result_key, images_dir, content)
+            else:
+                cleanup_images_directory(images_dir)
             
         else:
             await message.answer("❌ Не удалось создать изображения. Попробуйте еще раз.")
-            logger.error(f"❌ Не удалось создать изображения для пользователя {message.from_user.full_name}")
-            
-            processing_time = time.time() - start_time
-            logger.info(
-                f"user_id={message.from_user.id},"
-                f"prompt_length={len(text)},"
-                f"generation_time={processing_time},"
-                f"num_images={config.diffusion.num_images},"
-                f"success={False}"
-            )
+            logger.error(f"❌ Не удалось создать изображения для пользователя {user_name}")
+            success = False
         
-        total_time = time.time() - start_time
-        logger.info(
-            f"user_id={message.from_user.id},"
-            f"message_type={'voice' if is_voice else 'text'},"
-            f"processing_time={total_time}"
-        )
+        # Одна структурированная запись на каждый завершенный запрос
+        logger.info("GENERATION_STATS", extra={"stats": {
+            "user_id": user_id,
+            "message_type": "voice" if is_voice else "text",
+            "prompt_length": len(text),
+            "generation_time": time.perf_counter() - start_time,
+            "num_images": config.diffusion.num_images,
+            "success": success,
+        }})
         
     except asyncio.QueueFull:
         # Очередь переполнена
@@ -389,65 +787,87 @@ async def handle_generation_request(message: Message, text: str, is_voice: bool
             "⚠️ Слишком много запросов! Все устройства заняты, очередь переполнена.\n"
             "Попробуйте через несколько минут."
         )
-        logger.warning(f"⚠️ Очередь переполнена для пользователя {message.from_user.full_name}")
+        logger.warning(f"⚠️ Очередь переполнена для пользователя {user_name}")
         
     except Exception as e:
         logger.error(
             f"error={e},"
             f"context={{"
             f'"method": "handle_generation_request",'
-            f'"user_id": {message.from_user.id},'
+            f'"user_id": {user_id},'
             f'"text_length": {len(text) if text else 0}'
             f"}}"
         )
         await message.answer(BOT_MESSAGES["error"])
+    
+    finally:
+        # Забираем результат фоновой отправки, чтобы ошибка не потерялась
+        if pending_reply is not None:
+            for result in await asyncio.gather(pending_reply, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logger.warning(f"⚠️ Ошибка отправки ответа пользователю: {result}")
 
 async def cmd_start(message: Message, state: FSMContext):
     """Обработчик команды /start."""
+    user = message.from_user
+    user_info = f"{user.full_name} (@{user.username or 'unknown'})"
+    
     try:
         await state.clear()
         
-        user_info = f"{message.from_user.full_name} (@{message.from_user.username or 'unknown'})"
         logger.info(f"👤 Пользователь {user_info} выполнил START_COMMAND")
         
         await message.answer(BOT_MESSAGES["start"], parse_mode="HTML")
         
-        logger.info(f"✅ Отправлено приветствие пользователю {message.from_user.full_name}")
+        logger.info(f"✅ Отправлено приветствие пользователю {user_info}")
         
     except Exception as e:
-        logger.error(f"❌ Ошибка в cmd_start для пользователя {message.from_user.full_name}: {e}")
+        logger.error(f"❌ Ошибка в cmd_start для пользователя {user_info}: {e}")
         await message.answer(BOT_MESSAGES["error"])
 
 async def cmd_help(message: Message):
     """Обработчик команды /help."""
+    user = message.from_user
+    user_info = f"{user.full_name} (@{user.username or 'unknown'})"
+    
     try:
-        user_info = f"{message.from_user.full_name} (@{message.from_user.username or 'unknown'})"
         logger.info(f"👤 Пользователь {user_info} выполнил HELP_COMMAND")
         
         await message.answer(BOT_MESSAGES["help"], parse_mode="HTML")
         
-        logger.info(f"✅ Отправлена справка пользователю {message.from_user.full_name}")
+        logger.info(f"✅ Отправлена справка пользователю {user_info}")
         
     except Exception as e:
-        logger.error(f"❌ Ошибка в cmd_help для пользователя {message.from_user.full_name}: {e}")
+        logger.error(f"❌ Ошибка в cmd_help для пользователя {user_info}: {e}")
         await message.answer(BOT_MESSAGES["error"])
 
 async def handle_text_message(message: Message):
     """Обработчик текстовых сообщений."""
+    user = message.from_user
+    user_id = user.id
+    user_name = user.full_name
+    
     try:
-        text_preview = message.text[:50] + "..." if len(message.text) > 50 else message.text
-        logger.info(f"📝 Пользователь {message.from_user.full_name} отправил TEXT_MESSAGE длиной {len(message.text)} символов")
-        logger.debug(f"   Текст: {text_preview}")
+        text = message.text
+        logger.info(f"📝 Пользователь {user_name} отправил TEXT_MESSAGE длиной {len(text)} символов")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("   Текст: %s", preview_text(text, 50))
+        
+        # Отклоняем сообщения сверх лимита до постановки в очередь генерации
+        if not check_rate_limit(user_id):
+            await message.answer(BOT_MESSAGES["rate_limit"])
+            logger.warning(f"⚠️ Превышен лимит сообщений для пользователя {user_name}")
+            return
         
         # Используем общий обработчик
-        await handle_generation_request(message, message.text, is_voice=False)
+        await handle_generation_request(message, text, is_voice=False)
         
     except Exception as e:
         logger.error(
             f"error={e},"
             f"context={{"
             f'"method": "handle_text_message",'
-            f'"user_id": {message.from_user.id},'
+            f'"user_id": {user_id},'
             f'"text_length": {len(message.text) if message.text else 0}'
             f"}}"
         )
@@ -455,29 +875,39 @@ async def handle_text_message(message: Message):
 
 async def handle_voice_message(message: Message):
     """Обработчик голосовых сообщений."""
-    start_time = time.time()
+    user = message.from_user
+    user_id = user.id
+    user_name = user.full_name
+    bot = message.bot
+    
+    start_time = time.perf_counter()
     
     try:
         voice: Voice = message.voice
         
+        if not check_rate_limit(user_id):
+            await message.answer(BOT_MESSAGES["rate_limit"])
+            logger.warning(f"⚠️ Превышен лимит сообщений для пользователя {user_name}")
+            return
+        
         if voice.duration > config.security.max_voice_duration:
             await message.answer(BOT_MESSAGES["voice_too_long"])
-            logger.warning(f"⚠️ Пользователь {message.from_user.full_name} отправил слишком длинное голосовое сообщение ({voice.duration}с)")
+            logger.warning(f"⚠️ Пользователь {user_name} отправил слишком длинное голосовое сообщение ({voice.duration}с)")
             return
         
-        logger.info(f"🎤 Пользователь {message.from_user.full_name} отправил VOICE_MESSAGE длительностью {voice.duration}с, размером {voice.file_size} байт")
+        logger.info(f"🎤 Пользователь {user_name} отправил VOICE_MESSAGE длительностью {voice.duration}с, размером {voice.file_size} байт")
         
-        progress_callback = await create_progress_callback(message)
+        reporter = ProgressReporter(message)
         
         speech_processor = get_speech_processor()
         if not speech_processor:
             await message.answer("❌ Сервис распознавания речи временно недоступен. Попробуйте позже.")
-            logger.error(f"❌ Процессор речи недоступен для пользователя {message.from_user.full_name}")
+            logger.error(f"❌ Процессор речи недоступен для пользователя {user_name}")
             return
         
         # Проверяем статус Whisper пула
         whisper_status = speech_processor.whisper_pool.get_status()
-        logger.debug(f"🎤 Whisper статус: {whisper_status}")
+        logger.debug("🎤 Whisper статус: %s", whisper_status)
         
         # Уведомляем о позиции в очереди Whisper если есть ожидание
         if whisper_status["available_devices"] == 0:
@@ -486,54 +916,56 @@ async def handle_voice_message(message: Message):
                 f"Занято: {whisper_status['busy_devices']}/{whisper_status['total_devices']}"
             )
         
-        await progress_callback(
+        await reporter.report(
             "speech_recognition_start",
             expected_time=get_expected_speech_time(voice.duration)
         )
         
-        speech_start_time = time.time()
+        speech_start_time = time.perf_counter()
         recognized_text = await speech_processor.transcribe_telegram_voice(
-            bot=message.bot,
+            bot=bot,
             voice_message=voice,
-            user_id=message.from_user.id
+            user_id=user_id
         )
-        speech_time = time.time() - speech_start_time
+        speech_time = time.perf_counter() - speech_start_time
         
-        await progress_callback(
+        await reporter.report(
             "speech_recognition_done",
             actual_time=speech_time
         )
         
         if recognized_text:
-            logger.info(f"✅ Речь пользователя {message.from_user.full_name} успешно распознана за {speech_time:.2f}с")
-            logger.debug(f"   Распознанный текст: {recognized_text}")
+            logger.info(f"✅ Речь пользователя {user_name} успешно распознана за {speech_time:.2f}с")
+            logger.debug("   Распознанный текст: %s", recognized_text)
             
-            # Отправляем распознанный текст
-            await message.answer(
-                f"🎤 Распознанный текст:\n<i>{recognized_text}</i>",
+            # Отправляем распознанный текст, не дожидаясь ответа Telegram
+            # (экранируем: символы <, >, & в тексте ломают HTML-разметку сообщения)
+            reply_task = asyncio.create_task(message.answer(
+                f"🎤 Распознанный текст:\n<i>{html.escape(recognized_text, quote=False)}</i>",
                 parse_mode="HTML"
-            )
+            ))
             
             # Используем общий обработчик для генерации
-            await handle_generation_request(message, recognized_text, is_voice=True)
+            await handle_generation_request(message, recognized_text, is_voice=True,
+                                            pending_reply=reply_task, reporter=reporter)
         else:
-            logger.warning(f"⚠️ Не удалось распознать речь пользователя {message.from_user.full_name}")
+            logger.warning(f"⚠️ Не удалось распознать речь пользователя {user_name}")
             await message.answer("❌ Не удалось распознать речь. Попробуйте говорить четче.")
         
         # Логируем общее время обработки
-        total_time = time.time() - start_time
-        logger.info(
-            f"user_id={message.from_user.id},"
-            f"message_type=voice,"
-            f"processing_time={total_time}"
-        )
+        total_time = time.perf_counter() - start_time
+        logger.info("PROCESSING_STATS", extra={"stats": {
+            "user_id": user_id,
+            "message_type": "voice",
+            "processing_time": total_time,
+        }})
         
     except Exception as e:
         logger.error(
             f"error={e},"
             f"context={{"
             f'"method": "handle_voice_message",'
-            f'"user_id": {message.from_user.id},'
+            f'"user_id": {user_id},'
             f'"voice_duration": {getattr(voice, "duration", "unknown") if "voice" in locals() else "unknown"}'
             f"}}"
         )
@@ -541,26 +973,14 @@ async def handle_voice_message(message: Message):
 
 async def handle_unsupported_content(message: Message):
     """Обработчик неподдерживаемого контента."""
+    user = message.from_user
+    user_id = user.id
+    user_name = user.full_name
+    
     try:
-        content_type = "unknown"
-        if message.photo:
-            content_type = "photo"
-        elif message.video:
-            content_type = "video"
-        elif message.document:
-            content_type = "document"
-        elif message.sticker:
-            content_type = "sticker"
-        elif message.animation:
-            content_type = "animation"
-        elif message.video_note:
-            content_type = "video_note"
-        elif message.location:
-            content_type = "location"
-        elif message.contact:
-            content_type = "contact"
-        
-        logger.info(f"❓ Пользователь {message.from_user.full_name} отправил UNSUPPORTED_CONTENT типа: {content_type}")
+        content_type = message.content_type
+        
+        logger.info(f"❓ Пользователь {user_name} отправил UNSUPPORTED_CONTENT типа: {content_type}")
         
         await message.answer(
             "🤔 Я пока умею работать только с текстовыми и голосовыми сообщениями.\n\n"
@@ -573,7 +993,7 @@ async def handle_unsupported_content(message: Message):
             f"error={e},"
             f"context={{"
             f'"method": "handle_unsupported_content",'
-            f'"user_id": {message.from_user.id}'
+            f'"user_id": {user_id}'
             f"}}"
         )
         await message.answer(BOT_MESSAGES["error"])
@@ -587,30 +1007,22 @@ def register_handlers(dp: Dispatcher) -> None:
         dp.message.register(cmd_start, Command("start"))
         dp.message.register(cmd_help, Command("help"))
         
-        # Регистрация обработчиков контента
-        dp.message.register(handle_voice_message, F.voice)
-        dp.message.register(handle_text_message, F.text)
+        # Пока идет долгая обработка, пользователь видит статус "отправляет фото"
+        dp.message.middleware(ChatActionMiddleware())
+        
+        # Регистрация обработчиков контента (самые частые типы - первыми).
+        # Каждое обновление обрабатывается в отдельной задаче (handle_as_tasks),
+        # поэтому долгие генерации не блокируют друг друга
+        dp.message.register(handle_text_message, F.text,
+                            flags={"long_operation": "upload_photo"})
+        dp.message.register(handle_voice_message, F.voice,
+                            flags={"long_operation": "upload_photo"})
         
         # Обработчик неподдерживаемого контента (должен быть последним)
-        dp.message.register(
-            handle_unsupported_content,
-            F.photo | F.video | F.document | F.sticker | F.animation | 
-            F.video_note | F.location | F.contact
-        )
+        dp.message.register(handle_unsupported_content, UNSUPPORTED_CONTENT_FILTER)
         
         logger.info("✅ Все обработчики успешно зарегистрированы")
         
     except Exception as e:
         logger.error(f"❌ Ошибка регистрации обработчиков: {e}")
         raise
-
-# Функции для работы с rate limiting (заглушки для будущей реализации)
-async def check_rate_limit(user_id: int) -> bool:
-    """Проверка лимита сообщений для пользователя."""
-    # TODO: Реализовать rate limiting с использованием Redis или in-memory cache
-    return True
-
-async def update_rate_limit(user_id: int) -> None:
-    """Обновление счетчика сообщений для пользователя."""
-    # TODO: Реализовать обновление rate limiting
-    pass
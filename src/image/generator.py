@@ -5,22 +5,37 @@
 """
 
 import asyncio
+import os
 import time
-import gc
+import copy
 import re
 import shutil
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, List, Dict, Any
-from PIL import Image, ImageDraw, ImageFont
+from typing import Optional, List, Dict, Any, Tuple, Union, Callable
+from PIL import Image
 from contextlib import asynccontextmanager
 
 from src.utils.config import config
 from src.utils.logger import get_image_logger
-from transformers import MarianMTModel, MarianTokenizer
 
 # Инициализация логгера
 logger = get_image_logger()
 
+# Кэш CUDA/MPS аллокатора сбрасывается раз в столько освобождений устройства:
+# empty_cache синхронизирует устройство и лишает аллокатор готовых блоков
+EMPTY_CACHE_EVERY = 64
+
+# Сколько ждать попутных запросов перевода (секунды) и максимальный размер батча перевода
+TRANSLATION_BATCH_WAIT = 0.02
+TRANSLATION_MAX_BATCH = 16
+
+# Количество запомненных переводов (частые фразы вроде "С днём рождения!" не переводятся повторно)
+TRANSLATION_CACHE_SIZE = 1024
+
 class TranslatorPool:
     """Пул переводчиков для параллельного перевода текста."""
     
@@ -33,10 +48,24 @@ class TranslatorPool:
         """
         self.gpu_devices = gpu_devices
         self.model_name = "Helsinki-NLP/opus-mt-ru-en"
-        self.tokenizers: Dict[str, Any] = {}
+        # Токенизатор не хранит состояния запроса - один на все устройства
+        self.tokenizer: Any = None
         self.models: Dict[str, Any] = {}
-        self.available_devices = asyncio.Queue(maxsize=len(gpu_devices))
+        # Очередь запросов (текст, future): обработчик каждого устройства
+        # забирает из нее сразу несколько текстов и переводит их одним батчем
+        self.requests: asyncio.Queue = asyncio.Queue()
+        self._workers: List[asyncio.Task] = []
+        self._busy_devices = set()
+        self._release_counts: Dict[str, int] = defaultdict(int)
+        # LRU кэш готовых переводов: перевод детерминирован, повтор не требует модели
+        self._translations: "OrderedDict[str, str]" = OrderedDict()
+        # Отдельный поток на устройство: перевод не занимает общий executor asyncio
+        self.executors: Dict[str, ThreadPoolExecutor] = {
+            device: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"mt-{device}")
+            for device in gpu_devices
+        }
         self._initialized = False
+        self._init_lock = asyncio.Lock()
         
         logger.info(f"🔤 Инициализирован пул переводчиков с {len(gpu_devices)} устройствами: {gpu_devices}")
     
@@ -45,81 +74,179 @@ class TranslatorPool:
         if self._initialized:
             return
         
-        logger.info("📥 Загрузка моделей перевода на все устройства...")
-        
-        for device in self.gpu_devices:
-            try:
-                tokenizer, model = await self._load_translator_for_device(device)
-                if tokenizer and model:
-                    self.tokenizers[device] = tokenizer
-                    self.models[device] = model
-                    await self.available_devices.put(device)
-                    logger.info(f"✅ Модель перевода загружена для {device}")
-                else:
-                    logger.error(f"❌ Не удалось загрузить модель перевода для {device}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка загрузки модели перевода для {device}: {e}")
-        
-        self._initialized = True
-        logger.info(f"🚀 Пул переводчиков инициализирован с {len(self.models)} активными устройствами")
-    
-    async def _load_translator_for_device(self, device: str):
-        """Загрузка модели перевода для конкретного устройства."""
-        try:
-            import warnings
-            warnings.filterwarnings("ignore", message=".*add_prefix_space.*")
+        # Параллельные запросы не должны загружать модели повторно
+        async with self._init_lock:
+            if self._initialized:
+                return
             
-            # Загружаем в отдельном потоке
-            loop = asyncio.get_event_loop()
+            logger.info("📥 Загрузка моделей перевода на все устройства...")
             
-            tokenizer = await loop.run_in_executor(
-                None,
-                MarianTokenizer.from_pretrained,
-                self.model_name
-            )
+            # Веса читаются с диска один раз, на остальные устройства копируются из памяти
+            try:
+                tokenizer, base_model = await asyncio.to_thread(self._load_translator_sync)
+            except Exception as e:
+                logger.error(f"❌ Ошибка загрузки модели перевода {self.model_name}: {e}")
+                tokenizer, base_model = None, None
             
-            model = await loop.run_in_executor(
-                None,
-                MarianMTModel.from_pretrained,
-                self.model_name
-            )
+            if tokenizer and base_model:
+                self.tokenizer = tokenizer
+                last_index = len(self.gpu_devices) - 1
+                for index, device in enumerate(self.gpu_devices):
+                    try:
+                        model = await asyncio.get_running_loop().run_in_executor(
+                            self.executors[device],
+                            self._place_model_on_device,
+                            base_model,
+                            device,
+                            index != last_index
+                        )
+                        self.models[device] = model
+                        self._workers.append(asyncio.create_task(self._batch_worker(device)))
+                        logger.info(f"✅ Модель перевода загружена для {device}")
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка загрузки модели перевода для {device}: {e}")
             
-            # Перемещаем на устройство
-            if device != "cpu":
-                model = model.to(device)
+            self._initialized = True
+            logger.info(f"🚀 Пул переводчиков инициализирован с {len(self.models)} активными устройствами")
+    
+    def _load_translator_sync(self):
+        """Загрузка токенайзера и модели перевода с диска (выполняется в отдельном потоке)."""
+        import warnings
+        from transformers import MarianMTModel, MarianTokenizer
+        warnings.filterwarnings("ignore", message=".*add_prefix_space.*")
+        
+        tokenizer = MarianTokenizer.from_pretrained(self.model_name)
+        model = MarianMTModel.from_pretrained(self.model_name)
+        model.eval()
+        return tokenizer, model
+    
+    def _place_model_on_device(self, model, device: str, make_copy: bool):
+        """
+        Перемещение модели перевода на устройство (выполняется в отдельном потоке).
+        
+        Args:
+            model: Загруженная модель
+            device: Целевое устройство (на CUDA модель переводится в fp16)
+            make_copy: Переместить копию, оставив исходную модель для других устройств
+        """
+        if make_copy:
+            model = copy.deepcopy(model)
+        if device.startswith("cuda"):
+            model = model.half()
+        if device != "cpu":
+            model = model.to(device)
+        return model
+    
+    async def submit(self, text: str) -> str:
+        """
+        Перевод текста через очередь батчинга.
+        
+        Args:
+            text: Текст для перевода
             
-            return tokenizer, model
+        Returns:
+            str: Переведенный текст
             
-        except Exception as e:
-            logger.error(f"❌ Ошибка загрузки переводчика для {device}: {e}")
-            return None, None
-    
-    @asynccontextmanager
-    async def acquire_translator(self):
-        """Контекстный менеджер для получения переводчика из пула."""
+        Raises:
+            RuntimeError: Ни одна модель перевода не загружена
+        """
+        cached = self._translations.get(text)
+        if cached is not None:
+            self._translations.move_to_end(text)
+            return cached
+        
         if not self._initialized:
             await self.initialize()
         
-        # Ждем свободное устройство
-        device = await self.available_devices.get()
-        tokenizer = self.tokenizers.get(device)
-        model = self.models.get(device)
+        if not self._workers:
+            raise RuntimeError("Модели перевода недоступны")
         
-        if not tokenizer or not model:
-            await self.available_devices.put(device)
-            raise RuntimeError(f"Переводчик для {device} недоступен")
+        future = asyncio.get_running_loop().create_future()
+        await self.requests.put((text, future))
+        result = await future
         
-        try:
-            logger.debug(f"🔒 Получен доступ к переводчику {device}")
-            yield device, tokenizer, model
-        finally:
-            # Очищаем память и возвращаем устройство в пул
-            self._cleanup_device_memory(device)
-            await self.available_devices.put(device)
-            logger.debug(f"🔓 Освобожден переводчик {device}")
+        if result:
+            self._translations[text] = result
+            if len(self._translations) > TRANSLATION_CACHE_SIZE:
+                self._translations.popitem(last=False)
+        return result
+    
+    async def _batch_worker(self, device: str):
+        """
+        Обработчик очереди перевода для одного устройства.
+        
+        Берет первый запрос, ждет TRANSLATION_BATCH_WAIT попутных запросов
+        и переводит до TRANSLATION_MAX_BATCH текстов одним вызовом generate.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.requests.get()]
+            self._busy_devices.add(device)
+            try:
+                await asyncio.sleep(TRANSLATION_BATCH_WAIT)
+                while len(batch) < TRANSLATION_MAX_BATCH and not self.requests.empty():
+                    batch.append(self.requests.get_nowait())
+                
+                # Запросы, которые уже никто не ждет, не переводим
+                batch = [(text, future) for text, future in batch if not future.done()]
+                if not batch:
+                    continue
+                
+                logger.debug("🔤 Перевод %d текстов на %s", len(batch), device)
+                results = await loop.run_in_executor(
+                    self.executors[device],
+                    self._translate_batch_sync,
+                    device,
+                    [text for text, _ in batch]
+                )
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+                        
+            except Exception as e:
+                logger.error(f"❌ Ошибка перевода на {device}: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self._busy_devices.discard(device)
+                self._cleanup_device_memory(device)
+    
+    def _translate_batch_sync(self, device: str, texts: List[str]) -> List[str]:
+        """
+        Синхронный перевод нескольких текстов одним батчем (выполняется в потоке устройства).
+        
+        Args:
+            device: Устройство с загруженной моделью
+            texts: Тексты для перевода
+            
+        Returns:
+            List[str]: Переводы в том же порядке
+        """
+        import torch
+        
+        tokenizer = self.tokenizer
+        model = self.models[device]
+        
+        tokens = tokenizer(texts, return_tensors="pt", padding=True, truncation=True)
+        
+        # Перемещаем токены на то же устройство что и модель
+        # (на CUDA - из закрепленной памяти, копирование не блокирует поток)
+        if device.startswith("cuda"):
+            tokens = {k: v.pin_memory().to(model.device, non_blocking=True) for k, v in tokens.items()}
+        elif hasattr(model, 'device'):
+            tokens = {k: v.to(model.device) for k, v in tokens.items()}
+        
+        with torch.inference_mode():
+            translated = model.generate(**tokens)
+        return tokenizer.batch_decode(translated, skip_special_tokens=True)
     
     def _cleanup_device_memory(self, device: str):
-        """Очистка памяти конкретного устройства."""
+        """Периодическая очистка памяти устройства (раз в EMPTY_CACHE_EVERY освобождений)."""
+        self._release_counts[device] += 1
+        if self._release_counts[device] % EMPTY_CACHE_EVERY:
+            return
+        
         try:
             import torch
             
@@ -130,17 +257,18 @@ class TranslatorPool:
                 if hasattr(torch.mps, 'empty_cache'):
                     torch.mps.empty_cache()
             
-            gc.collect()
-            
         except Exception as e:
             logger.debug(f"Ошибка очистки памяти переводчика {device}: {e}")
     
     def get_status(self) -> Dict[str, Any]:
         """Получение статуса пула переводчиков."""
+        available_devices = len(self.models) - len(self._busy_devices)
         return {
             "total_devices": len(self.gpu_devices),
-            "available_devices": self.available_devices.qsize(),
-            "busy_devices": len(self.gpu_devices) - self.available_devices.qsize(),
+            "available_devices": available_devices,
+            "busy_devices": len(self.gpu_devices) - available_devices,
+            "queue_size": self.requests.qsize(),
+            "cached_translations": len(self._translations),
             "model_name": self.model_name,
             "initialized": self._initialized
         }
@@ -159,6 +287,38 @@ def get_translator_pool() -> TranslatorPool:
         _translator_pool = TranslatorPool(gpu_devices)
     return _translator_pool
 
+# Вес нового замера в среднем времени генерации устройства
+GENERATION_TIME_EMA_ALPHA = 0.3
+
+# Директория кэша загруженных pipeline (config.diffusion.fast_cache)
+PIPELINE_CACHE_DIR = Path.home() / ".cache" / "hbd_pipeline"
+
+# Запас видеопамяти под активации и декодирование VAE сверх весов pipeline:
+# если веса с этим запасом не помещаются в свободную память, включается sequential CPU offload
+OFFLOAD_HEADROOM_BYTES = 2 << 30
+
+# Количество шагов прогревочной генерации после загрузки pipeline
+WARMUP_INFERENCE_STEPS = 2
+
+# Длина нулевой последовательности эмбеддингов T5 для FLUX без T5
+NULL_T5_SEQUENCE_LENGTH = 256
+
+# Уровень сжатия PNG: 1 - в несколько раз быстрее уровня по умолчанию (6) ценой чуть большего файла
+PNG_COMPRESS_LEVEL = 1
+
+# Количество потоков для параллельного удаления старых временных файлов
+CLEANUP_WORKERS = 8
+
+# Буквы русского алфавита (для определения необходимости перевода)
+RUSSIAN_LETTERS = frozenset("абвгдеёжзийклмнопрстуфхцчшщъыьэюяАБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ")
+
+# Количество промптов, эмбеддинги которых хранятся для повторного использования
+PROMPT_EMBEDS_CACHE_SIZE = 32
+
+# Параметры генерации для LCM планировщика (config.diffusion.scheduler: "lcm")
+LCM_INFERENCE_STEPS = 4
+LCM_GUIDANCE_SCALE = 1.0
+
 class GPUPool:
     """Пул GPU для параллельной генерации изображений."""
     
@@ -171,9 +331,23 @@ class GPUPool:
         """
         self.gpu_devices = gpu_devices
         self.pipelines: Dict[str, Any] = {}
-        self.available_gpus = asyncio.Queue(maxsize=len(gpu_devices))
+        # Свободные GPU упорядочены по среднему времени генерации:
+        # при нескольких свободных устройствах задачу получает самое быстрое
+        self.available_gpus = asyncio.PriorityQueue(maxsize=len(gpu_devices))
+        self.generation_times: Dict[str, float] = {device: 0.0 for device in gpu_devices}
+        self._release_counts: Dict[str, int] = defaultdict(int)
         self.generation_queue = asyncio.Queue(maxsize=config.diffusion.max_queue_size)
+        # Отдельный поток на GPU: загрузка и генерация всегда в одном потоке устройства
+        # и не занимают общий executor asyncio
+        self.executors: Dict[str, ThreadPoolExecutor] = {
+            device: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"sd-{device}")
+            for device in gpu_devices
+        }
+        # Параметры прогревочной генерации (pipeline -> аргументы вызова). Задает ImageGenerator,
+        # чтобы прогрев шел теми же параметрами и эмбеддингами, что и запросы пользователей
+        self.warmup_params: Optional[Callable[[Any], dict]] = None
         self._initialized = False
+        self._init_lock = asyncio.Lock()
         
         logger.info(f"🎮 Инициализирован GPU пул с {len(gpu_devices)} устройствами: {gpu_devices}")
     
@@ -182,115 +356,320 @@ class GPUPool:
         if self._initialized:
             return
         
-        logger.info("📥 Загрузка моделей на все GPU...")
-        
-        for device in self.gpu_devices:
-            try:
-                pipeline = await self._load_pipeline_for_device(device)
-                if pipeline:
-                    self.pipelines[device] = pipeline
-                    await self.available_gpus.put(device)
-                    logger.info(f"✅ Pipeline загружен для {device}")
-                else:
-                    logger.error(f"❌ Не удалось загрузить pipeline для {device}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка загрузки pipeline для {device}: {e}")
-        
-        self._initialized = True
-        logger.info(f"🚀 GPU пул инициализирован с {len(self.pipelines)} активными устройствами")
+        # Параллельные запросы не должны загружать модели повторно
+        async with self._init_lock:
+            if self._initialized:
+                return
+            
+            logger.info("📥 Загрузка моделей на все GPU...")
+            
+            for device in self.gpu_devices:
+                try:
+                    pipeline = await self._load_pipeline_for_device(device)
+                    if pipeline:
+                        self.pipelines[device] = pipeline
+                        await self.available_gpus.put((self.generation_times[device], device))
+                        logger.info(f"✅ Pipeline загружен для {device}")
+                    else:
+                        logger.error(f"❌ Не удалось загрузить pipeline для {device}")
+                except Exception as e:
+                    logger.error(f"❌ Ошибка загрузки pipeline для {device}: {e}")
+            
+            self._initialized = True
+            logger.info(f"🚀 GPU пул инициализирован с {len(self.pipelines)} активными устройствами")
     
     async def _load_pipeline_for_device(self, device: str):
-        """Загрузка pipeline для конкретного устройства."""
+        """Загрузка pipeline для конкретного устройства (в потоке устройства, не блокируя event loop)."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executors[device], self._load_pipeline_sync, device
+        )
+    
+    def _load_pipeline_sync(self, device: str):
+        """Синхронная загрузка pipeline для конкретного устройства."""
         try:
-            import torch
-            from diffusers import (
-                StableDiffusionXLPipeline, 
-                StableDiffusionPipeline,
-                DiffusionPipeline
-            )
+            cache_path = self._get_pipeline_cache_path(device) if config.diffusion.fast_cache else None
+            pipeline = self._load_cached_pipeline(cache_path) if cache_path else None
             
-            model_name = config.diffusion.model
-            
-            # Определяем тип pipeline по названию модели
-            if "flux" in model_name.lower():
-                try:
-                    from diffusers import FluxPipeline
-                    pipeline_class = FluxPipeline
-                    
-                    load_kwargs = {
-                        "torch_dtype": torch.bfloat16 if device != "cpu" else torch.float32,
-                    }
-                    
-                    pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
-                    
-                except ImportError:
-                    logger.error(f"❌ FluxPipeline не найден для {device}")
+            if pipeline is None:
+                pipeline = self._from_pretrained_sync(device)
+                if pipeline is None:
                     return None
-                    
-            elif "xl" in model_name.lower():
-                pipeline_class = StableDiffusionXLPipeline
-                
-                load_kwargs = {
-                    "torch_dtype": torch.float16 if device != "cpu" else torch.float32,
-                    "safety_checker": None,
-                    "requires_safety_checker": False
-                }
-                
-                if device != "cpu":
-                    load_kwargs["variant"] = "fp16"
-                
-                pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
-                
-            elif "stable-diffusion" in model_name.lower():
-                pipeline_class = StableDiffusionPipeline
+                if cache_path:
+                    self._save_cached_pipeline(pipeline, cache_path)
+            
+            if config.diffusion.tiny_vae:
+                self._use_tiny_vae(pipeline, device)
+            
+            # При выгрузке на CPU модули размещают хуки offload, а не .to(device):
+            # иначе pipeline, которому нужна выгрузка, не поместится уже при переносе
+            offload_mode = self._get_offload_mode(pipeline, device)
+            if offload_mode is None:
+                pipeline = pipeline.to(device)
+            
+            # diffusers и так загружает модули в eval, но кэш и замена VAE идут в обход from_pretrained
+            self._set_eval_mode(pipeline)
+            
+            # Применяем оптимизации
+            self._apply_optimizations(pipeline, device, offload_mode)
+            
+            # Прогрев при предзагрузке на старте (и всегда для torch.compile,
+            # иначе компиляция придется на первый запрос)
+            if config.diffusion.preload_model or config.diffusion.compile_model:
+                self._warmup_pipeline(pipeline, device)
+            
+            return pipeline
+            
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки pipeline для {device}: {e}")
+            return None
+    
+    def _from_pretrained_sync(self, device: str):
+        """Загрузка pipeline из репозитория модели (на CPU, с dtype для устройства)."""
+        import torch
+        from diffusers import (
+            StableDiffusionXLPipeline, 
+            StableDiffusionPipeline,
+            DiffusionPipeline
+        )
+        
+        model_name = config.diffusion.model
+        
+        # Определяем тип pipeline по названию модели
+        if "flux" in model_name.lower():
+            try:
+                from diffusers import FluxPipeline
+                pipeline_class = FluxPipeline
                 
                 load_kwargs = {
-                    "torch_dtype": torch.float16 if device != "cpu" else torch.float32,
-                    "safety_checker": None,
-                    "requires_safety_checker": False
+                    "torch_dtype": self._get_torch_dtype(device, torch.bfloat16),
                 }
                 
-                if device != "cpu":
-                    load_kwargs["variant"] = "fp16"
+                # Без T5 (~9.5B параметров) модель грузится быстрее и занимает меньше памяти
+                if config.diffusion.drop_t5:
+                    load_kwargs["text_encoder_2"] = None
+                    load_kwargs["tokenizer_2"] = None
                 
                 pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
                 
-            else:
-                pipeline_class = DiffusionPipeline
-                
-                load_kwargs = {
-                    "torch_dtype": torch.float16 if device != "cpu" else torch.float32,
-                }
+            except ImportError:
+                logger.error(f"❌ FluxPipeline не найден для {device}")
+                return None
                 
-                pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
+        elif "xl" in model_name.lower():
+            pipeline_class = StableDiffusionXLPipeline
             
-            # Перемещаем на устройство
-            pipeline = pipeline.to(device)
+            load_kwargs = {
+                "torch_dtype": self._get_torch_dtype(device, torch.float16),
+                "safety_checker": None,
+                "requires_safety_checker": False
+            }
             
-            # Применяем оптимизации
-            self._apply_optimizations(pipeline, device)
+            if device != "cpu":
+                load_kwargs["variant"] = "fp16"
             
-            return pipeline
+            pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
+            
+        elif "stable-diffusion" in model_name.lower():
+            pipeline_class = StableDiffusionPipeline
+            
+            load_kwargs = {
+                "torch_dtype": self._get_torch_dtype(device, torch.float16),
+                "safety_checker": None,
+                "requires_safety_checker": False
+            }
+            
+            if device != "cpu":
+                load_kwargs["variant"] = "fp16"
             
+            pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
+            
+        else:
+            pipeline_class = DiffusionPipeline
+            
+            load_kwargs = {
+                "torch_dtype": self._get_torch_dtype(device, torch.float16),
+            }
+            
+            pipeline = pipeline_class.from_pretrained(model_name, **load_kwargs)
+        
+        return pipeline
+    
+    def _set_eval_mode(self, pipeline):
+        """Перевод всех модулей pipeline в режим eval (без dropout и обновления статистик)."""
+        import torch
+        
+        for component in pipeline.components.values():
+            if isinstance(component, torch.nn.Module):
+                component.eval()
+    
+    def _use_tiny_vae(self, pipeline, device: str):
+        """
+        Замена VAE на дистиллированный AutoencoderTiny (TAESD).
+        
+        Декодирование становится почти бесплатным по времени и видеопамяти
+        ценой небольшой потери мелких деталей.
+        """
+        import torch
+        from diffusers import AutoencoderTiny
+        
+        model_name = config.diffusion.model.lower()
+        if "flux" in model_name:
+            tiny_vae_name, default_dtype = "madebyollin/taef1", torch.bfloat16
+        elif "xl" in model_name:
+            tiny_vae_name, default_dtype = "madebyollin/taesdxl", torch.float16
+        else:
+            tiny_vae_name, default_dtype = "madebyollin/taesd", torch.float16
+        
+        try:
+            pipeline.vae = AutoencoderTiny.from_pretrained(
+                tiny_vae_name, torch_dtype=self._get_torch_dtype(device, default_dtype)
+            )
+            logger.info(f"🪶 VAE заменен на {tiny_vae_name} для {device}")
         except Exception as e:
-            logger.error(f"❌ Ошибка загрузки pipeline для {device}: {e}")
+            logger.warning(f"⚠️ Не удалось загрузить {tiny_vae_name}, оставляем полный VAE: {e}")
+    
+    def _get_torch_dtype(self, device: str, default_dtype):
+        """
+        Тип весов pipeline для устройства.
+        
+        Args:
+            device: Устройство
+            default_dtype: Тип по умолчанию для GPU (зависит от модели)
+            
+        Returns:
+            torch.dtype: float32 на CPU, иначе config.diffusion.dtype или default_dtype при "auto"
+        """
+        import torch
+        
+        if device == "cpu":
+            return torch.float32
+        if config.diffusion.dtype == "auto":
+            return default_dtype
+        return getattr(torch, config.diffusion.dtype)
+    
+    def _get_pipeline_cache_path(self, device: str) -> Path:
+        """Путь к файлу кэша pipeline (свой файл на каждый тип весов и набор текстовых энкодеров)."""
+        import torch
+        
+        is_flux = "flux" in config.diffusion.model.lower()
+        model_tag = re.sub(r"[^\w.-]", "_", config.diffusion.model)
+        default_dtype = torch.bfloat16 if is_flux else torch.float16
+        dtype_tag = str(self._get_torch_dtype(device, default_dtype)).replace("torch.", "")
+        # FLUX без T5 (drop_t5) - другой состав pipeline, кэши не должны подменять друг друга
+        t5_tag = "_no_t5" if is_flux and config.diffusion.drop_t5 else ""
+        return PIPELINE_CACHE_DIR / f"{model_tag}_{dtype_tag}{t5_tag}.pt"
+    
+    def _load_cached_pipeline(self, cache_path: Path):
+        """
+        Загрузка pipeline из кэша torch.save.
+        
+        Returns:
+            Pipeline на CPU или None, если кэша нет или он поврежден
+        """
+        if not cache_path.exists():
             return None
+        
+        try:
+            import torch
+            
+            pipeline = torch.load(cache_path, map_location="cpu", weights_only=False)
+            logger.info(f"⚡ Pipeline загружен из кэша: {cache_path}")
+            return pipeline
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось загрузить pipeline из кэша {cache_path}: {e}")
+            return None
+    
+    def _save_cached_pipeline(self, pipeline, cache_path: Path):
+        """Сохранение pipeline в кэш (ошибки записи не прерывают загрузку)."""
+        try:
+            import torch
+            
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+            torch.save(pipeline, tmp_path)
+            os.replace(tmp_path, cache_path)
+            logger.info(f"💾 Pipeline сохранен в кэш: {cache_path}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить pipeline в кэш {cache_path}: {e}")
+    
+    def _apply_scheduler(self, pipeline):
+        """Замена планировщика pipeline согласно config.diffusion.scheduler."""
+        scheduler_name = config.diffusion.scheduler.lower()
+        if not scheduler_name:
+            return
+        
+        # FLUX использует flow matching, планировщики SD к нему не подходят
+        if "flux" in config.diffusion.model.lower():
+            logger.warning(f"⚠️ Планировщик {scheduler_name} не поддерживается для FLUX, оставляем стандартный")
+            return
+        
+        if scheduler_name == "dpmsolver++":
+            from diffusers import DPMSolverMultistepScheduler
+            pipeline.scheduler = DPMSolverMultistepScheduler.from_config(
+                pipeline.scheduler.config,
+                algorithm_type="dpmsolver++",
+                use_karras_sigmas=True
+            )
+        elif scheduler_name == "lcm":
+            from diffusers import LCMScheduler
+            pipeline.scheduler = LCMScheduler.from_config(pipeline.scheduler.config)
+        else:
+            logger.warning(f"⚠️ Неизвестный планировщик {scheduler_name}, оставляем стандартный")
+            return
+        
+        logger.info(f"🗓️ Планировщик: {type(pipeline.scheduler).__name__}")
     
-    def _apply_optimizations(self, pipeline, device: str):
-        """Применение оптимизаций для конкретного устройства."""
+    def _apply_optimizations(self, pipeline, device: str, offload_mode: Optional[str] = None):
+        """
+        Применение оптимизаций для конкретного устройства.
+        
+        Args:
+            pipeline: Загруженный pipeline
+            device: Устройство
+            offload_mode: Режим выгрузки на CPU из _get_offload_mode
+        """
         try:
+            self._apply_scheduler(pipeline)
+            
             if device.startswith("cuda"):
+                import torch
+                
+                # Размеры входов фиксированы конфигурацией - выбор ядер cuDNN кэшируется
+                torch.backends.cudnn.benchmark = True
+                # Оставшиеся fp32 операции (например, VAE SDXL в fp32) - на TF32 Tensor Core
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.allow_tf32 = True
+                
+                self._use_channels_last(pipeline)
+                
+                if config.diffusion.quantize:
+                    self._quantize_denoiser(pipeline, device)
+                
                 if hasattr(pipeline, 'enable_memory_efficient_attention'):
                     pipeline.enable_memory_efficient_attention()
-                    
-                if config.diffusion.enable_xformers:
+                
+                # xformers - только если нет встроенного SDPA (FlashAttention-2 в PyTorch 2.x)
+                if not self._enable_sdpa_attention(pipeline) and config.diffusion.enable_xformers:
                     try:
                         pipeline.enable_xformers_memory_efficient_attention()
                     except Exception:
                         pass
-                        
-                if config.diffusion.enable_cpu_offload:
-                    pipeline.enable_model_cpu_offload()
+                
+                # Декодирование VAE - пик памяти на больших изображениях
+                self._enable_vae_memory_savings(pipeline)
+                
+                # Кэш шагов ставится до torch.compile, чтобы его хуки попали в граф
+                if config.diffusion.step_cache_threshold > 0:
+                    self._enable_step_cache(pipeline, device)
+                
+                # Pipeline не помещается в свободную видеопамять - послойная выгрузка на CPU
+                if offload_mode == "sequential":
+                    logger.info(f"🐢 Мало видеопамяти на {device}, включаем sequential CPU offload")
+                    pipeline.enable_sequential_cpu_offload(device=device)
+                elif offload_mode == "model":
+                    pipeline.enable_model_cpu_offload(device=device)
+                elif config.diffusion.compile_model:
+                    self._compile_denoiser(pipeline, device)
                     
             elif device == "mps":
                 if hasattr(pipeline, 'enable_attention_slicing'):
@@ -303,43 +682,254 @@ class GPUPool:
         except Exception as e:
             logger.warning(f"⚠️ Ошибка применения оптимизаций для {device}: {e}")
     
+    def _use_channels_last(self, pipeline):
+        """
+        Перевод сверточных модулей (UNet, VAE) в формат channels_last.
+        
+        cuDNN сразу выбирает NHWC ядра для Tensor Core без внутренних транспонирований.
+        У FLUX нет сверточного UNet, поэтому для него меняется только VAE.
+        """
+        import torch
+        
+        for module_name in ("unet", "vae"):
+            module = getattr(pipeline, module_name, None)
+            if module is not None:
+                module.to(memory_format=torch.channels_last)
+    
+    def _get_offload_mode(self, pipeline, device: str) -> Optional[str]:
+        """
+        Выбор выгрузки на CPU для pipeline, еще не перенесенного на устройство.
+        
+        Returns:
+            Optional[str]: "sequential" если веса с запасом OFFLOAD_HEADROOM_BYTES не помещаются
+            в свободную видеопамять, "model" при enable_cpu_offload, иначе None
+        """
+        if not device.startswith("cuda"):
+            return None
+        
+        import torch
+        
+        free_bytes, _ = torch.cuda.mem_get_info(torch.device(device))
+        weights_bytes = sum(
+            tensor.numel() * tensor.element_size()
+            for component in pipeline.components.values()
+            if isinstance(component, torch.nn.Module)
+            for tensor in (*component.parameters(), *component.buffers())
+        )
+        if weights_bytes + OFFLOAD_HEADROOM_BYTES > free_bytes:
+            logger.debug(
+                "Веса pipeline %.1f ГБ, свободно на %s %.1f ГБ",
+                weights_bytes / (1 << 30), device, free_bytes / (1 << 30)
+            )
+            return "sequential"
+        if config.diffusion.enable_cpu_offload:
+            return "model"
+        return None
+    
+    def _enable_vae_memory_savings(self, pipeline):
+        """Включение поочередного (slicing) и потайлового (tiling для SDXL/FLUX) декодирования VAE."""
+        vae = getattr(pipeline, "vae", None)
+        if vae is None:
+            return
+        
+        if hasattr(vae, "enable_slicing"):
+            vae.enable_slicing()
+        
+        model_name = config.diffusion.model.lower()
+        if ("xl" in model_name or "flux" in model_name) and hasattr(vae, "enable_tiling"):
+            vae.enable_tiling()
+    
+    def _quantize_denoiser(self, pipeline, device: str):
+        """
+        Квантование весов UNet (или transformer у FLUX) через optimum-quanto.
+        
+        VAE не квантуется: декодирование выполняется один раз и редко бывает узким местом.
+        """
+        import torch
+        
+        quantize_mode = config.diffusion.quantize.lower()
+        if quantize_mode not in ("int8", "fp8"):
+            logger.warning(f"⚠️ Неизвестный режим квантования {quantize_mode}, пропускаем")
+            return
+        
+        if quantize_mode == "fp8" and torch.cuda.get_device_capability(device) < (8, 9):
+            # Аппаратный fp8 есть только начиная с Ada/Hopper
+            logger.warning(f"⚠️ {device} не поддерживает fp8, используем int8")
+            quantize_mode = "int8"
+        
+        try:
+            from optimum.quanto import quantize, freeze, qint8, qfloat8
+        except ImportError:
+            logger.error("❌ optimum-quanto не установлен (pip install optimum-quanto), квантование пропущено")
+            return
+        
+        module_name = "transformer" if getattr(pipeline, "transformer", None) is not None else "unet"
+        module = getattr(pipeline, module_name, None)
+        if module is None:
+            return
+        
+        try:
+            quantize(module, weights=qfloat8 if quantize_mode == "fp8" else qint8)
+            freeze(module)
+            logger.info(f"🗜️ Веса {module_name} квантованы в {quantize_mode} на {device}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось квантовать {module_name} на {device}: {e}")
+    
+    def _enable_sdpa_attention(self, pipeline) -> bool:
+        """
+        Включение scaled_dot_product_attention для UNet.
+        
+        У FLUX собственные процессоры внимания, которые уже используют SDPA,
+        поэтому transformer не трогаем.
+        
+        Returns:
+            bool: True если внимание выполняется через SDPA
+        """
+        import torch
+        
+        if not hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+            return False
+        
+        unet = getattr(pipeline, "unet", None)
+        if unet is None:
+            return getattr(pipeline, "transformer", None) is not None
+        
+        try:
+            from diffusers.models.attention_processor import AttnProcessor2_0
+            unet.set_attn_processor(AttnProcessor2_0())
+            return True
+        except Exception as e:
+            logger.debug("SDPA недоступен для UNet: %s", e)
+            return False
+    
+    def _enable_step_cache(self, pipeline, device: str):
+        """
+        First Block Cache: пропуск шагов денойзинга через para-attn.
+        
+        Если выход первого блока transformer почти не изменился с прошлого шага
+        (относительная разница ниже step_cache_threshold), остальные блоки не
+        считаются, а используется сохраненный остаток предыдущего шага.
+        """
+        try:
+            from para_attn.first_block_cache.diffusers_adapters import apply_cache_on_pipe
+        except ImportError:
+            logger.error("❌ para-attn не установлен (pip install para-attn), кэш шагов пропущен")
+            return
+        
+        threshold = config.diffusion.step_cache_threshold
+        try:
+            apply_cache_on_pipe(pipeline, residual_diff_threshold=threshold)
+            logger.info(f"♻️ Кэш шагов включен на {device} (порог {threshold})")
+        except Exception as e:
+            # Адаптеры есть не для всех архитектур (например, UNet SD/SDXL)
+            logger.warning(f"⚠️ Кэш шагов не поддерживается для {type(pipeline).__name__}: {e}")
+    
+    def _compile_denoiser(self, pipeline, device: str):
+        """
+        Компиляция UNet (или transformer у FLUX) через torch.compile.
+        
+        Размеры входов фиксированы конфигурацией, поэтому скомпилированный граф
+        переиспользуется во всех генерациях. Сама компиляция происходит при
+        прогревочной генерации после загрузки (_warmup_pipeline), а не на первом
+        запросе пользователя.
+        """
+        import torch
+        
+        if not hasattr(torch, "compile"):
+            logger.warning("⚠️ torch.compile недоступен (нужен PyTorch 2.0+)")
+            return
+        
+        module_name = "transformer" if getattr(pipeline, "transformer", None) is not None else "unet"
+        if getattr(pipeline, module_name, None) is None:
+            return
+        
+        try:
+            torch._inductor.config.conv_1x1_as_mm = True
+            setattr(pipeline, module_name, torch.compile(
+                getattr(pipeline, module_name), mode="reduce-overhead", fullgraph=False
+            ))
+            logger.info(f"🔧 {module_name} на {device} будет скомпилирован при прогреве")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось скомпилировать {module_name} на {device}: {e}")
+    
+    def _warmup_pipeline(self, pipeline, device: str):
+        """
+        Прогревочная генерация с размерами из конфигурации.
+        
+        Инициализирует CUDA контекст и ядра (cuDNN autotune, граф torch.compile),
+        чтобы первый запрос пользователя не ждал этой работы. Формы входов должны
+        совпадать с настоящими запросами, поэтому параметры строит warmup_params.
+        """
+        if self.warmup_params is None:
+            logger.debug("Прогрев %s пропущен: параметры прогрева не заданы", device)
+            return
+        
+        try:
+            import torch
+            
+            logger.info(f"🔥 Прогрев pipeline на {device}...")
+            start_time = time.perf_counter()
+            with torch.inference_mode():
+                pipeline(**self.warmup_params(pipeline))
+            logger.info(f"✅ Pipeline на {device} прогрет за {time.perf_counter() - start_time:.1f}с")
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка прогрева pipeline на {device}: {e}")
+    
     @asynccontextmanager
     async def acquire_gpu(self):
         """Контекстный менеджер для получения GPU из пула."""
         if not self._initialized:
             await self.initialize()
         
-        # Ждем свободную GPU
-        device = await self.available_gpus.get()
+        # Ждем свободную GPU (самую быструю из свободных)
+        _, device = await self.available_gpus.get()
         pipeline = self.pipelines.get(device)
         
         if not pipeline:
-            await self.available_gpus.put(device)
+            await self.available_gpus.put((self.generation_times[device], device))
             raise RuntimeError(f"Pipeline для {device} недоступен")
         
         try:
             logger.debug(f"🔒 Получен доступ к {device}")
+            start_time = time.perf_counter()
             yield device, pipeline
+            self._update_generation_time(device, time.perf_counter() - start_time)
         finally:
             # Очищаем память и возвращаем GPU в пул
             self._cleanup_device_memory(device)
-            await self.available_gpus.put(device)
+            await self.available_gpus.put((self.generation_times[device], device))
             logger.debug(f"🔓 Освобожден {device}")
     
+    def _update_generation_time(self, device: str, elapsed: float):
+        """Обновление экспоненциального среднего времени генерации устройства."""
+        previous = self.generation_times[device]
+        self.generation_times[device] = elapsed if previous == 0.0 else (
+            GENERATION_TIME_EMA_ALPHA * elapsed + (1 - GENERATION_TIME_EMA_ALPHA) * previous
+        )
+    
     def _cleanup_device_memory(self, device: str):
-        """Очистка памяти конкретного устройства."""
+        """Периодическая очистка памяти устройства (раз в EMPTY_CACHE_EVERY освобождений)."""
+        self._release_counts[device] += 1
+        if self._release_counts[device] % EMPTY_CACHE_EVERY:
+            return
+        
         try:
             import torch
             
             if device.startswith("cuda"):
                 with torch.cuda.device(device):
+                    reserved_before = torch.cuda.memory_reserved()
                     torch.cuda.empty_cache()
+                    torch.cuda.ipc_collect()
+                    # Рост зарезервированной памяти от очистки к очистке - признак утечки
+                    logger.debug(
+                        "🧹 %s: зарезервировано %.0f MB -> %.0f MB",
+                        device, reserved_before / 2**20, torch.cuda.memory_reserved() / 2**20
+                    )
             elif device == "mps":
                 if hasattr(torch.mps, 'empty_cache'):
                     torch.mps.empty_cache()
             
-            gc.collect()
-            
         except Exception as e:
             logger.debug(f"Ошибка очистки памяти {device}: {e}")
     
@@ -351,6 +941,7 @@ class GPUPool:
             "busy_gpus": len(self.gpu_devices) - self.available_gpus.qsize(),
             "queue_size": self.generation_queue.qsize(),
             "max_queue_size": config.diffusion.max_queue_size,
+            "generation_times": dict(self.generation_times),
             "initialized": self._initialized
         }
 
@@ -367,20 +958,38 @@ def get_gpu_pool() -> GPUPool:
         _gpu_pool = GPUPool(gpu_devices)
     return _gpu_pool
 
+@lru_cache(maxsize=1)
+def check_generation_dependencies() -> bool:
+    """Проверка наличия torch, diffusers и transformers (результат кэшируется)."""
+    try:
+        import torch
+        import diffusers
+        import transformers
+        logger.info("✅ Все зависимости для локальной генерации доступны")
+        return True
+    except ImportError as e:
+        logger.error(f"❌ Отсутствуют зависимости: {e}")
+        logger.error("Установите: pip install torch diffusers transformers")
+        return False
+
 class ImageGenerator:
     """Генератор поздравительных изображений с локальными AI моделями."""
     
-    def __init__(self, progress_callback=None):
-        """
-        Инициализация генератора.
-        
-        Args:
-            progress_callback: Функция для отправки сообщений о прогрессе
-        """
-        self.progress_callback = progress_callback
+    def __init__(self):
+        """Инициализация генератора."""
         self.gpu_pool = get_gpu_pool()
+        self.gpu_pool.warmup_params = self._get_warmup_params
         self.translator_pool = get_translator_pool()
         
+        # Эмбеддинги недавних промптов: (устройство, промпт, негативный промпт, CFG) -> аргументы pipeline.
+        # Заполняется из потоков генерации, поэтому защищено threading.Lock
+        self._prompt_embeds_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._prompt_embeds_lock = threading.Lock()
+        
+        # Очередь динамического батчинга (config.diffusion.max_batch_size > 1)
+        self._batch_queue: Optional[asyncio.Queue] = None
+        self._batch_workers: List[asyncio.Task] = []
+        
         logger.info("🎨 Инициализирован multi-GPU генератор изображений")
         logger.info(f"   Модель: {config.diffusion.model}")
         logger.info(f"   Количество изображений: {config.diffusion.num_images}")
@@ -398,7 +1007,7 @@ class ImageGenerator:
         """Получение ожидаемого времени генерации изображений в секундах."""
         model_name = config.diffusion.model.lower()
         num_images = config.diffusion.num_images
-        steps = config.diffusion.num_inference_steps
+        steps, _ = self._get_sampling_settings()
         
         # Базовое время на одно изображение (для одной GPU)
         if "flux" in model_name:
@@ -414,36 +1023,30 @@ class ImageGenerator:
         
         return int(total_time)
 
-    async def _send_progress_message(self, message_key: str, **kwargs):
-        """Отправка сообщения о прогрессе через callback."""
-        if self.progress_callback:
+    async def _send_progress_message(self, reporter, message_key: str, **kwargs):
+        """Отправка сообщения о прогрессе через reporter запроса (если он передан)."""
+        if reporter is not None:
             try:
-                await self.progress_callback(message_key, **kwargs)
+                await reporter.report(message_key, **kwargs)
             except Exception as e:
                 logger.warning(f"⚠️ Ошибка отправки сообщения о прогрессе: {e}")
 
     def _check_dependencies(self):
-        """Проверка необходимых зависимостей."""
-        try:
-            import torch
-            import diffusers
-            logger.info("✅ Все зависимости для локальной генерации доступны")
-            return True
-        except ImportError as e:
-            logger.error(f"❌ Отсутствуют зависимости: {e}")
-            logger.error("Установите: pip install torch diffusers transformers")
-            return False
+        """Проверка необходимых зависимостей (выполняется один раз за процесс)."""
+        return check_generation_dependencies()
 
-    async def generate_birthday_image(self, text: str, user_id: int) -> Optional[str]:
+    async def generate_birthday_image(self, text: str, user_id: int, reporter=None) -> Tuple[Optional[Path], Optional[str]]:
         """
         Генерация поздравительных картинок с использованием GPU пула.
         
         Args:
             text: Текст поздравления
             user_id: ID пользователя
+            reporter: Объект прогресса запроса с методом async report(message_key, **kwargs)
             
         Returns:
-            Путь к директории с сгенерированными изображениями или None при ошибке
+            Кортеж (путь к директории с сохраненными изображениями, переведенный текст).
+            При ошибке путь равен None; если путь возвращен, изображения в нем есть
         """
         start_time = time.time()
         
@@ -451,7 +1054,7 @@ class ImageGenerator:
             logger.info(f"🎨 Начинаем генерацию {config.diffusion.num_images} изображений для пользователя {user_id}")
             
             # Создаем временную директорию для пользователя
-            output_dir = config.create_temp_images_dir(user_id)
+            output_dir = Path(config.create_temp_images_dir(user_id))
             logger.info(f"📁 Создана временная директория: {output_dir}")
             
             # Инициализируем пул если нужно
@@ -459,22 +1062,27 @@ class ImageGenerator:
                 await self.gpu_pool.initialize()
             
             # Генерируем изображения с использованием GPU пула
-            images, content = await self._generate_with_gpu_pool(text)
+            images, content = await self._generate_with_gpu_pool(text, reporter)
             
             if images and len(images) > 0:
-                # Сохраняем все изображения в директорию
+                # Сохраняем все изображения в директорию параллельно
+                # (libpng отпускает GIL во время сжатия)
+                targets = [
+                    (i, image, output_dir / f"birthday_card_{i+1}.png")
+                    for i, image in enumerate(images) if image
+                ]
+                results = await asyncio.gather(
+                    *(asyncio.to_thread(self._save_image, image, image_path) for _, image, image_path in targets),
+                    return_exceptions=True
+                )
+                
                 saved_paths = []
-                for i, image in enumerate(images):
-                    if image:
-                        filename = f"birthday_card_{i+1}.png"
-                        image_path = Path(output_dir) / filename
-                        
-                        try:
-                            image.save(image_path, "PNG", quality=95)
-                            saved_paths.append(str(image_path))
-                            logger.debug(f"✅ Сохранено изображение {i+1}: {filename}")
-                        except Exception as e:
-                            logger.error(f"❌ Ошибка сохранения изображения {i+1}: {e}")
+                for (i, _, image_path), result in zip(targets, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"❌ Ошибка сохранения изображения {i+1}: {result}")
+                    else:
+                        saved_paths.append(str(image_path))
+                        logger.debug(f"✅ Сохранено изображение {i+1}: {image_path.name}")
                 
                 if saved_paths:
                     generation_time = time.time() - start_time
@@ -482,96 +1090,225 @@ class ImageGenerator:
                     return output_dir, content
                 else:
                     logger.error("❌ Не удалось сохранить ни одного изображения")
-                    self._cleanup_directory(output_dir)
-                    return None
+                    await self._cleanup_directory(output_dir)
+                    return None, content
             else:
                 logger.error("❌ Не удалось сгенерировать изображения")
-                self._cleanup_directory(output_dir)
-                return None
+                await self._cleanup_directory(output_dir)
+                return None, content
                 
         except Exception as e:
             logger.error(f"❌ Ошибка генерации изображений для пользователя {user_id}: {e}")
             if 'output_dir' in locals():
-                self._cleanup_directory(output_dir)
-            return None
+                await self._cleanup_directory(output_dir)
+            return None, None
 
-    async def _generate_with_gpu_pool(self, text: str) -> Optional[List[Image.Image]]:
+    def _save_image(self, image: Image.Image, image_path: Path) -> None:
+        """Сохранение изображения в PNG с быстрым сжатием (выполняется в отдельном потоке)."""
+        image.save(image_path, "PNG", compress_level=PNG_COMPRESS_LEVEL)
+
+    async def _generate_with_gpu_pool(self, text: str, reporter=None) -> Tuple[Optional[List[Image.Image]], Optional[str]]:
         """
         Генерация изображений с использованием GPU пула.
         
         Args:
             text: Текст поздравления
+            reporter: Объект прогресса запроса (может быть None)
             
         Returns:
-            Список PIL Image или None при ошибке
+            Кортеж (список PIL Image или None при ошибке, переведенный текст)
         """
+        content = None
+        # Перевод идет параллельно с ожиданием свободной GPU в очереди
+        prompt_task = asyncio.ensure_future(self._prepare_prompt(text, reporter))
         try:
-            # Создаем промпт
-            await self._send_progress_message(
-                "translation_start",
-                expected_time=self._get_expected_translation_time()
-            )
-            translation_start_time = time.time()
+            if config.diffusion.max_batch_size > 1:
+                # Одновременные запросы объединяются в один вызов pipeline
+                prompt, content, generation_start_time = await prompt_task
+                images = await self._submit_to_batch(prompt)
+            else:
+                # Получаем GPU из пула и генерируем
+                async with self.gpu_pool.acquire_gpu() as (device, pipeline):
+                    prompt, content, generation_start_time = await prompt_task
+                    logger.info(f"🎮 Генерация на {device}")
+                    
+                    # Параметры генерации
+                    generation_params = self._get_generation_params(prompt)
+                    
+                    # Запускаем генерацию в потоке устройства
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        self.gpu_pool.executors[device],
+                        self._run_pipeline,
+                        pipeline,
+                        generation_params
+                    )
+                    images = result.images if result and getattr(result, 'images', None) else None
 
-            prompt, content = await self._create_birthday_prompt(text)
-            logger.info(f"📝 Промпт: {prompt}.")
-            
-            translation_time = time.time() - translation_start_time
+            generation_time = time.time() - generation_start_time
             await self._send_progress_message(
-                "translation_done",
-                actual_time=translation_time
+                reporter,
+                "image_generation_done",
+                actual_time=generation_time
             )
 
-            await self._send_progress_message(
-                "image_generation_start",
-                num_images=config.diffusion.num_images,
-                expected_time=self._get_expected_generation_time()
-            )
-            generation_start_time = time.time()
+            # Получаем изображения из результата
+            if images:
+                logger.info(f"✅ Успешно сгенерировано {len(images)} изображений")
+                return images, content
+            else:
+                logger.error("❌ Не удалось получить изображения из результата")
+                return None, content
+                
+        except Exception as e:
+            logger.error(f"❌ Ошибка генерации с GPU пулом: {e}")
+            return None, content
+        
+        finally:
+            # GPU не получена - перевод больше не нужен
+            if not prompt_task.done():
+                prompt_task.cancel()
 
-            # Получаем GPU из пула и генерируем
-            async with self.gpu_pool.acquire_gpu() as (device, pipeline):
-                logger.info(f"🎮 Генерация на {device}")
+    async def _submit_to_batch(self, prompt: str) -> Optional[List[Image.Image]]:
+        """
+        Постановка промпта в очередь динамического батчинга.
+        
+        Returns:
+            Изображения этого промпта или None при ошибке
+        """
+        if self._batch_queue is None:
+            # Очередь и обработчики создаются в работающем event loop, по одному на GPU
+            self._batch_queue = asyncio.Queue()
+            self._batch_workers = [
+                asyncio.create_task(self._batch_worker())
+                for _ in self.gpu_pool.gpu_devices
+            ]
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._batch_queue.put((prompt, future))
+        return await future
+
+    async def _batch_worker(self):
+        """
+        Обработчик очереди батчинга.
+        
+        Берет первый запрос, ждет batch_timeout_ms попутных запросов, получает GPU
+        и добирает из очереди все, что накопилось за время ожидания (до max_batch_size).
+        """
+        while True:
+            batch = [await self._batch_queue.get()]
+            try:
+                await asyncio.sleep(config.diffusion.batch_timeout_ms / 1000)
                 
-                # Параметры генерации
-                generation_params = self._get_generation_params(prompt)
+                async with self.gpu_pool.acquire_gpu() as (device, pipeline):
+                    while len(batch) < config.diffusion.max_batch_size and not self._batch_queue.empty():
+                        batch.append(self._batch_queue.get_nowait())
+                    
+                    # Запросы, которые уже никто не ждет, не генерируем
+                    batch = [(prompt, future) for prompt, future in batch if not future.done()]
+                    if not batch:
+                        continue
+                    
+                    logger.info(f"🎮 Генерация {len(batch)} запросов одним батчем на {device}")
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        self.gpu_pool.executors[device],
+                        self._run_pipeline_batch,
+                        pipeline,
+                        [self._get_generation_params(prompt) for prompt, _ in batch]
+                    )
                 
-                # Запускаем генерацию в отдельном потоке
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    None,
-                    self._run_pipeline,
-                    pipeline,
-                    generation_params
-                )
-
-                generation_time = time.time() - generation_start_time
-                await self._send_progress_message(
-                    "image_generation_done",
-                    actual_time=generation_time
-                )
+                images = result.images if result and getattr(result, 'images', None) else None
+                num_images = config.diffusion.num_images
+                for index, (_, future) in enumerate(batch):
+                    if not future.done():
+                        future.set_result(images[index * num_images:(index + 1) * num_images] if images else None)
+                        
+            except Exception as e:
+                logger.error(f"❌ Ошибка батчевой генерации: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
 
-                # Получаем изображения из результата
-                if result and hasattr(result, 'images') and result.images:
-                    images = result.images
-                    logger.info(f"✅ Успешно сгенерировано {len(images)} изображений на {device}")
-                    return images, content
-                else:
-                    logger.error("❌ Не удалось получить изображения из результата")
-                    return None
+    def _run_pipeline_batch(self, pipeline, params_list: List[dict]):
+        """
+        Запуск pipeline для нескольких промптов одним вызовом (в потоке устройства).
+        
+        Эмбеддинги промптов объединяются по батчу, изображения в результате
+        идут по порядку промптов, по num_images на каждый.
+        """
+        try:
+            import torch
+            
+            with torch.inference_mode():
+                params_list = [self._with_prompt_embeds(pipeline, params) for params in params_list]
+                
+                params = dict(params_list[0])
+                for name, value in params.items():
+                    if isinstance(value, torch.Tensor):
+                        params[name] = torch.cat([item[name] for item in params_list])
+                    elif name in ("prompt", "negative_prompt"):
+                        params[name] = [item[name] for item in params_list]
+                    elif name == "generator":
+                        params[name] = [generator for item in params_list for generator in item[name]]
                 
+                return pipeline(**params)
         except Exception as e:
-            logger.error(f"❌ Ошибка генерации с GPU пулом: {e}")
+            logger.error(f"❌ Ошибка выполнения pipeline: {e}")
             return None
 
+    async def _prepare_prompt(self, text: str, reporter=None) -> Tuple[str, str, float]:
+        """
+        Перевод текста и создание промпта с сообщениями о прогрессе.
+        
+        Args:
+            text: Текст поздравления
+            reporter: Объект прогресса запроса (может быть None)
+            
+        Returns:
+            Кортеж (промпт, переведенный текст, время начала этапа генерации)
+        """
+        await self._send_progress_message(
+            reporter,
+            "translation_start",
+            expected_time=self._get_expected_translation_time()
+        )
+        translation_start_time = time.time()
+
+        prompt, content = await self._create_birthday_prompt(text)
+        logger.info(f"📝 Промпт: {prompt}.")
+        
+        translation_time = time.time() - translation_start_time
+        await self._send_progress_message(
+            reporter,
+            "translation_done",
+            actual_time=translation_time
+        )
+
+        # Этап генерации включает ожидание GPU, если она еще не освободилась
+        await self._send_progress_message(
+            reporter,
+            "image_generation_start",
+            num_images=config.diffusion.num_images,
+            expected_time=self._get_expected_generation_time()
+        )
+        return prompt, content, time.time()
+
+    def _get_sampling_settings(self) -> Tuple[int, float]:
+        """Количество шагов и guidance scale с учетом планировщика."""
+        if config.diffusion.scheduler.lower() == "lcm" and "flux" not in config.diffusion.model.lower():
+            return LCM_INFERENCE_STEPS, LCM_GUIDANCE_SCALE
+        return config.diffusion.num_inference_steps, config.diffusion.guidance_scale
+
     def _get_generation_params(self, prompt: str) -> dict:
         """Получение параметров генерации."""
+        steps, guidance_scale = self._get_sampling_settings()
         params = {
             "prompt": prompt,
             "height": config.diffusion.height,
             "width": config.diffusion.width,
-            "num_inference_steps": config.diffusion.num_inference_steps,
-            "guidance_scale": config.diffusion.guidance_scale,
+            "num_inference_steps": steps,
+            "guidance_scale": guidance_scale,
             "num_images_per_prompt": config.diffusion.num_images,
         }
         
@@ -580,24 +1317,148 @@ class ImageGenerator:
             if config.diffusion.negative_prompt:
                 params["negative_prompt"] = config.diffusion.negative_prompt
         
-        # Добавляем generator для seed
+        # Добавляем generator для seed: отдельный генератор на каждое изображение,
+        # чтобы картинка i зависела только от seed + i, а не от размера батча
         if config.diffusion.seed >= 0:
             import torch
-            params["generator"] = torch.Generator().manual_seed(config.diffusion.seed)
+            params["generator"] = [
+                torch.Generator().manual_seed(config.diffusion.seed + i)
+                for i in range(config.diffusion.num_images)
+            ]
         
         return params
 
+    def _get_warmup_params(self, pipeline) -> dict:
+        """
+        Параметры прогревочной генерации (вызывается из потока устройства под inference_mode).
+        
+        Те же размеры, guidance (с учетом LCM) и эмбеддинги, что у запроса пользователя,
+        только с меньшим числом шагов: форма батча и граф torch.compile совпадают.
+        """
+        params = self._get_generation_params("warmup")
+        params["num_inference_steps"] = min(params["num_inference_steps"], WARMUP_INFERENCE_STEPS)
+        return self._with_prompt_embeds(pipeline, params)
+
     def _run_pipeline(self, pipeline, params: dict):
         """Запуск pipeline в отдельном потоке."""
         try:
             import torch
             
-            with torch.no_grad():
+            with torch.inference_mode():
+                params = self._with_prompt_embeds(pipeline, params)
                 return pipeline(**params)
         except Exception as e:
             logger.error(f"❌ Ошибка выполнения pipeline: {e}")
             return None
 
+    def _with_prompt_embeds(self, pipeline, params: dict) -> dict:
+        """
+        Замена текстового промпта на закэшированные эмбеддинги.
+        
+        Повторный промпт на том же устройстве не прогоняется через текстовые энкодеры.
+        Если эмбеддинги для модели посчитать нельзя, параметры возвращаются без изменений.
+        
+        SD/SDXL сами повторяют готовые эмбеддинги на num_images_per_prompt, а FLUX
+        нет: для него эмбеддинги считаются сразу на все изображения промпта, а
+        pipeline получает num_images_per_prompt=1. Иначе при объединении нескольких
+        запросов в батч латентов становится в num_images раз больше, чем эмбеддингов.
+        """
+        key = (
+            str(pipeline._execution_device),
+            params["prompt"],
+            params.get("negative_prompt"),
+            params["guidance_scale"] > 1,
+            params["num_images_per_prompt"],
+        )
+        
+        with self._prompt_embeds_lock:
+            embeds = self._prompt_embeds_cache.get(key)
+            if embeds is not None:
+                self._prompt_embeds_cache.move_to_end(key)
+        
+        if embeds is None:
+            embeds = self._encode_prompt(pipeline, params)
+            if embeds is None:
+                return params
+            
+            with self._prompt_embeds_lock:
+                self._prompt_embeds_cache[key] = embeds
+                while len(self._prompt_embeds_cache) > PROMPT_EMBEDS_CACHE_SIZE:
+                    self._prompt_embeds_cache.popitem(last=False)
+        
+        params = {name: value for name, value in params.items() if name not in ("prompt", "negative_prompt")}
+        params.update(embeds)
+        if "flux" in config.diffusion.model.lower():
+            params["num_images_per_prompt"] = 1
+        return params
+
+    def _encode_prompt(self, pipeline, params: dict) -> Optional[Dict[str, Any]]:
+        """
+        Расчет эмбеддингов промпта для FLUX, SDXL и SD.
+        
+        Returns:
+            Словарь аргументов pipeline (*_prompt_embeds) или None для других моделей
+        """
+        model_name = config.diffusion.model.lower()
+        prompt = params["prompt"]
+        negative_prompt = params.get("negative_prompt")
+        do_cfg = params["guidance_scale"] > 1
+        device = pipeline._execution_device
+        
+        if "flux" in model_name:
+            # FLUX не повторяет переданные эмбеддинги - строки сразу на каждое изображение
+            num_images = params["num_images_per_prompt"]
+            if pipeline.text_encoder_2 is None:
+                return self._null_t5_prompt_embeds(pipeline, prompt, device, num_images)
+            prompt_embeds, pooled_prompt_embeds, _ = pipeline.encode_prompt(
+                prompt=prompt, prompt_2=None, device=device, num_images_per_prompt=num_images
+            )
+            return {"prompt_embeds": prompt_embeds, "pooled_prompt_embeds": pooled_prompt_embeds}
+        
+        if "xl" in model_name:
+            prompt_embeds, negative_embeds, pooled, negative_pooled = pipeline.encode_prompt(
+                prompt=prompt,
+                device=device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=do_cfg,
+                negative_prompt=negative_prompt
+            )
+            embeds = {"prompt_embeds": prompt_embeds, "pooled_prompt_embeds": pooled}
+            if do_cfg:
+                embeds["negative_prompt_embeds"] = negative_embeds
+                embeds["negative_pooled_prompt_embeds"] = negative_pooled
+            return embeds
+        
+        if "stable-diffusion" in model_name:
+            prompt_embeds, negative_embeds = pipeline.encode_prompt(
+                prompt, device, 1, do_cfg, negative_prompt=negative_prompt
+            )
+            embeds = {"prompt_embeds": prompt_embeds}
+            if do_cfg:
+                embeds["negative_prompt_embeds"] = negative_embeds
+            return embeds
+        
+        return None
+
+    def _null_t5_prompt_embeds(self, pipeline, prompt: str, device, num_images: int) -> Dict[str, Any]:
+        """
+        Эмбеддинги для FLUX без T5 (config.diffusion.drop_t5).
+        
+        Pooled эмбеддинг считается CLIP, вместо последовательности T5 передаются нули.
+        Обе части содержат по строке на каждое из num_images изображений.
+        """
+        import torch
+        
+        pooled_prompt_embeds = pipeline._get_clip_prompt_embeds(
+            prompt=prompt, num_images_per_prompt=num_images, device=device
+        )
+        prompt_embeds = torch.zeros(
+            (pooled_prompt_embeds.shape[0], NULL_T5_SEQUENCE_LENGTH, pipeline.transformer.config.joint_attention_dim),
+            dtype=pooled_prompt_embeds.dtype,
+            device=device
+        )
+        return {"prompt_embeds": prompt_embeds, "pooled_prompt_embeds": pooled_prompt_embeds}
+
     async def _create_birthday_prompt(self, text: str) -> str:
         """
         Создание промпта для генерации изображения.
@@ -634,12 +1495,21 @@ class ImageGenerator:
         return prompt, content
 
     def has_russian(self, text):
-        return bool(re.search(r"[а-яА-ЯёЁ]", text))
+        """
+        Проверка наличия русских букв в тексте.
+        
+        Проверка пересечения с frozenset выполняется одним проходом на C без
+        регулярного выражения. Проверка по первому байту UTF-8 (0xD0-0xD1) не
+        подходит: под нее попадает вся кириллица, включая украинские буквы.
+        """
+        return not RUSSIAN_LETTERS.isdisjoint(text)
 
     async def translate_text(self, text: str) -> str:
         """
         Перевод текста на английский с использованием пула переводчиков.
         
+        Одновременные запросы переводятся пулом одним батчем.
+        
         Args:
             text: Текст для перевода
             
@@ -647,70 +1517,29 @@ class ImageGenerator:
             str: Переведенный текст
         """
         try:
-            # Получаем переводчик из пула
-            async with self.translator_pool.acquire_translator() as (device, tokenizer, model):
-                logger.debug(f"🔤 Перевод на {device}")
-                
-                # Запускаем перевод в отдельном потоке
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    None,
-                    self._translate_sync,
-                    tokenizer,
-                    model,
-                    text
-                )
-                
-                return result if result else text
+            result = await self.translator_pool.submit(text)
+            return result if result else text
                 
         except Exception as e:
             logger.error(f"❌ Ошибка перевода текста: {e}")
             return text  # Возвращаем оригинальный текст при ошибке
-    
-    def _translate_sync(self, tokenizer, model, text: str) -> str:
-        """
-        Синхронный перевод текста (выполняется в отдельном потоке).
-        
-        Args:
-            tokenizer: Токенайзер модели
-            model: Модель перевода
-            text: Текст для перевода
-            
-        Returns:
-            str: Переведенный текст
-        """
-        try:
-            tokens = tokenizer(text, return_tensors="pt", padding=True, truncation=True)
-            
-            # Перемещаем токены на то же устройство что и модель
-            if hasattr(model, 'device'):
-                tokens = {k: v.to(model.device) for k, v in tokens.items()}
-            
-            translated = model.generate(**tokens)
-            result = tokenizer.decode(translated[0], skip_special_tokens=True)
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"❌ Ошибка синхронного перевода: {e}")
-            return text
 
-    def _cleanup_directory(self, directory_path: str) -> None:
+    async def _cleanup_directory(self, directory_path: Union[str, Path]) -> None:
         """
-        Очистка директории и её удаление.
+        Очистка директории и её удаление (в отдельном потоке, не блокируя event loop).
         
         Args:
             directory_path: Путь к директории для удаления
         """
         try:
-            dir_path = Path(directory_path)
-            if dir_path.exists() and dir_path.is_dir():
-                shutil.rmtree(dir_path)
-                logger.debug(f"🗑️ Удалена директория: {directory_path}")
+            await asyncio.to_thread(shutil.rmtree, directory_path)
+            logger.debug(f"🗑️ Удалена директория: {directory_path}")
+        except FileNotFoundError:
+            pass
         except Exception as e:
             logger.warning(f"⚠️ Не удалось удалить директорию {directory_path}: {e}")
 
-    def cleanup_temp_files(self, max_age_hours: int = 24) -> None:
+    async def cleanup_temp_files(self, max_age_hours: int = 24) -> None:
         """
         Очистка старых временных файлов и директорий.
         
@@ -718,43 +1547,71 @@ class ImageGenerator:
             max_age_hours: Максимальный возраст файлов в часах
         """
         try:
-            temp_dir = Path(config.paths.temp_images)
-            if not temp_dir.exists():
-                return
-            
-            max_age_seconds = max_age_hours * 3600
-            current_time = time.time()
-            
-            cleaned_count = 0
-            
-            # Очищаем старые директории с изображениями
-            for dir_path in temp_dir.glob("birthday_cards_*"):
-                if dir_path.is_dir():
-                    if current_time - dir_path.stat().st_mtime > max_age_seconds:
-                        try:
-                            shutil.rmtree(dir_path)
-                            cleaned_count += 1
-                            logger.debug(f"🗑️ Удалена старая директория: {dir_path.name}")
-                        except Exception as e:
-                            logger.warning(f"⚠️ Не удалось удалить директорию {dir_path}: {e}")
-            
-            # Очищаем отдельные старые файлы (для совместимости)
-            for file_path in temp_dir.glob("birthday_card_*.png"):
-                if current_time - file_path.stat().st_mtime > max_age_seconds:
-                    try:
-                        file_path.unlink()
-                        cleaned_count += 1
-                        logger.debug(f"🗑️ Удален старый файл: {file_path.name}")
-                    except Exception as e:
-                        logger.warning(f"⚠️ Не удалось удалить файл {file_path}: {e}")
-            
+            cleaned_count = await asyncio.to_thread(self._cleanup_temp_files_sync, max_age_hours * 3600)
             if cleaned_count > 0:
                 logger.info(f"🧹 Очищено {cleaned_count} старых элементов")
                 
         except Exception as e:
             logger.error(f"❌ Ошибка очистки временных файлов: {e}")
 
-    def get_image_paths_from_dir(self, directory_path: str) -> List[str]:
+    def _cleanup_temp_files_sync(self, max_age_seconds: int) -> int:
+        """
+        Удаление старых директорий birthday_cards_* и файлов birthday_card_*.png за один проход.
+        
+        Args:
+            max_age_seconds: Максимальный возраст в секундах
+            
+        Returns:
+            int: Количество удаленных элементов
+        """
+        current_time = time.time()
+        
+        # Один scandir вместо двух glob и отдельного stat на каждый элемент
+        try:
+            with os.scandir(config.paths.temp_images) as entries:
+                old_entries = [
+                    (entry.path, entry.name, entry.is_dir(follow_symlinks=False))
+                    for entry in entries
+                    if entry.name.startswith("birthday_card")
+                    and current_time - entry.stat(follow_symlinks=False).st_mtime > max_age_seconds
+                ]
+        except FileNotFoundError:
+            return 0
+        
+        if len(old_entries) <= 1:
+            return sum(map(self._remove_temp_entry, old_entries))
+        
+        # Удаление - последовательность системных вызовов unlink/rmdir, потоки перекрывают ожидание диска
+        with ThreadPoolExecutor(max_workers=min(CLEANUP_WORKERS, len(old_entries))) as executor:
+            return sum(executor.map(self._remove_temp_entry, old_entries))
+    
+    def _remove_temp_entry(self, old_entry: Tuple[str, str, bool]) -> bool:
+        """
+        Удаление одной старой директории или файла.
+        
+        Args:
+            old_entry: Кортеж (путь, имя, является ли директорией)
+            
+        Returns:
+            bool: True если элемент удален
+        """
+        path, name, is_dir = old_entry
+        try:
+            # Директории с изображениями
+            if is_dir and name.startswith("birthday_cards_"):
+                shutil.rmtree(path)
+            # Отдельные файлы (для совместимости)
+            elif not is_dir and name.startswith("birthday_card_") and name.endswith(".png"):
+                os.unlink(path)
+            else:
+                return False
+            logger.debug(f"🗑️ Удален старый элемент: {name}")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось удалить {path}: {e}")
+            return False
+
+    def get_image_paths_from_dir(self, directory_path: Union[str, Path]) -> List[str]:
         """
         Получение путей ко всем изображениям в директории.
         
@@ -765,19 +1622,22 @@ class ImageGenerator:
             Список путей к изображениям
         """
         try:
-            dir_path = Path(directory_path)
-            if not dir_path.exists() or not dir_path.is_dir():
+            # Один проход по директории вместо отдельного stat на каждый файл
+            try:
+                with os.scandir(directory_path) as entries:
+                    existing = {entry.name: entry.path for entry in entries if entry.is_file()}
+            except (FileNotFoundError, NotADirectoryError):
                 logger.warning(f"⚠️ Директория не существует: {directory_path}")
                 return []
             
-            # Ищем PNG файлы с названием birthday_card_*
+            # Ищем PNG файлы с названием birthday_card_* в порядке номеров
             image_paths = []
             for i in range(1, config.diffusion.num_images + 1):
-                image_path = dir_path / f"birthday_card_{i}.png"
-                if image_path.exists():
-                    image_paths.append(str(image_path))
+                filename = f"birthday_card_{i}.png"
+                if filename in existing:
+                    image_paths.append(existing[filename])
                 else:
-                    logger.warning(f"⚠️ Изображение не найдено: {image_path}")
+                    logger.warning(f"⚠️ Изображение не найдено: {os.path.join(directory_path, filename)}")
             
             logger.debug(f"📁 Найдено {len(image_paths)} изображений в {directory_path}")
             return image_paths
@@ -795,13 +1655,14 @@ class ImageGenerator:
         """
         gpu_status = self.gpu_pool.get_status()
         translator_status = self.translator_pool.get_status()
+        dependencies_installed = self._check_dependencies()
         
         return {
-            "local_diffusion_available": self._check_dependencies(),
+            "local_diffusion_available": dependencies_installed,
             "local_model": config.diffusion.model,
             "gpu_pool_status": gpu_status,
             "translator_pool_status": translator_status,
             "num_images_per_generation": config.diffusion.num_images,
-            "dependencies_installed": self._check_dependencies()
+            "dependencies_installed": dependencies_installed
         }
     
\ No newline at end of file
@@ -6,7 +6,6 @@
 
 import asyncio
 import argparse
-import logging
 import os
 import sys
 from pathlib import Path
@@ -15,6 +14,10 @@ from datetime import datetime
 # Добавляем родительскую директорию в sys.path для импортов
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Настройка CUDA аллокатора против фрагментации памяти между генерациями.
+# Должна быть задана до первого импорта torch (его импортируют whisper и transformers)
+os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,max_split_size_mb:512")
+
 # Импорты aiogram 3.x
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
@@ -22,7 +25,7 @@ from dotenv import load_dotenv
 
 # Импорты модулей проекта
 from src.bot.bot_instance import BotManager
-from src.bot.handlers import register_handlers
+from src.bot.handlers import register_handlers, start_model_warmup
 from src.utils.config import config
 from src.utils.logger import setup_project_logging, get_module_logger
 
@@ -113,6 +116,31 @@ def validate_environment() -> bool:
         logger.info("✅ Проверка окружения прошла успешно")
     return True
 
+def cleanup_temp_directories() -> int:
+    """
+    Удаление всех временных файлов (блокирующая функция для запуска в потоке).
+    
+    Returns:
+        int: Количество удаленных файлов
+    """
+    temp_dirs = [
+        Path(config.paths.temp_audio),
+        Path(config.paths.temp_images)
+    ]
+    
+    cleaned_count = 0
+    for temp_dir in temp_dirs:
+        if temp_dir.exists():
+            for temp_file in temp_dir.rglob("*"):
+                if temp_file.is_file():
+                    try:
+                        temp_file.unlink()
+                        cleaned_count += 1
+                    except Exception as e:
+                        logger.debug(f"Не удалось удалить файл {temp_file}: {e}")
+    
+    return cleaned_count
+
 async def on_startup(dispatcher: Dispatcher, bot: Bot) -> None:
     """
     Действия при запуске бота.
@@ -125,27 +153,29 @@ async def on_startup(dispatcher: Dispatcher, bot: Bot) -> None:
     logger.info("🚀 Запуск Birthday Bot...")
     logger.info("=" * 50)
     
-    # Получаем информацию о боте
-    try:
-        me = await bot.get_me()
-        logger.info(f"🤖 Информация о боте:")
-        logger.info(f"   ID: {me.id}")
-        logger.info(f"   Имя: {me.first_name}")
-        logger.info(f"   Username: @{me.username}")
-        logger.info(f"   Может работать в группах: {me.can_join_groups}")
-    except Exception as e:
-        logger.error(f"❌ Ошибка получения информации о боте: {e}")
-    
-    # Настройка команд бота
+    # Настройка команд бота и получение информации о боте (параллельно)
     bot_manager = dispatcher.get("bot_manager")
+    me = None
     if bot_manager:
         try:
-            await bot_manager.setup_commands()
+            await bot_manager.prime()
             logger.info("✅ Команды бота настроены")
         except Exception as e:
             logger.error(f"❌ Ошибка настройки команд бота: {e}")
+        me = bot_manager.bot_info
     else:
         logger.warning("⚠️ Менеджер бота не найден")
+        try:
+            me = await bot.get_me()
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения информации о боте: {e}")
+    
+    if me:
+        logger.info(f"🤖 Информация о боте:")
+        logger.info(f"   ID: {me.id}")
+        logger.info(f"   Имя: {me.first_name}")
+        logger.info(f"   Username: @{me.username}")
+        logger.info(f"   Может работать в группах: {me.can_join_groups}")
     
     # Регистрация обработчиков
     try:
@@ -155,6 +185,10 @@ async def on_startup(dispatcher: Dispatcher, bot: Bot) -> None:
         logger.error(f"❌ Ошибка регистрации обработчиков: {e}")
         raise
     
+    # Загрузка моделей в фоне, пока бот уже принимает сообщения
+    if config.diffusion.preload_model:
+        dispatcher["warmup_tasks"] = start_model_warmup()
+    
     # Логируем статус конфигурации
     status = config.get_status()
     logger.info("📊 Статус системы:")
@@ -165,21 +199,8 @@ async def on_startup(dispatcher: Dispatcher, bot: Bot) -> None:
     # Очистка при старте если включена
     if config.production.cleanup_on_start:
         try:
-            temp_dirs = [
-                Path(config.paths.temp_audio),
-                Path(config.paths.temp_images)
-            ]
-            
-            cleaned_count = 0
-            for temp_dir in temp_dirs:
-                if temp_dir.exists():
-                    for temp_file in temp_dir.rglob("*"):
-                        if temp_file.is_file():
-                            try:
-                                temp_file.unlink()
-                                cleaned_count += 1
-                            except Exception:
-                                pass
+            # Обход файловой системы не должен блокировать event loop
+            cleaned_count = await asyncio.to_thread(cleanup_temp_directories)
             
             if cleaned_count > 0:
                 logger.info(f"🧹 Очищено {cleaned_count} старых временных файлов")
@@ -203,21 +224,7 @@ async def on_shutdown(dispatcher: Dispatcher) -> None:
     
     # Очистка временных файлов
     try:
-        temp_dirs = [
-            Path(config.paths.temp_audio),
-            Path(config.paths.temp_images)
-        ]
-        
-        cleaned_count = 0
-        for temp_dir in temp_dirs:
-            if temp_dir.exists():
-                for temp_file in temp_dir.rglob("*"):
-                    if temp_file.is_file():
-                        try:
-                            temp_file.unlink()
-                            cleaned_count += 1
-                        except Exception as e:
-                            logger.debug(f"Не удалось удалить файл {temp_file}: {e}")
+        cleaned_count = await asyncio.to_thread(cleanup_temp_directories)
         
         if cleaned_count > 0:
             logger.info(f"✅ Очищено {cleaned_count} временных файлов")
@@ -281,6 +288,7 @@ async def main() -> None:
         await dp.start_polling(
             bot,
             skip_updates=True,  # Пропускаем обновления, накопившиеся за время остановки
+            handle_as_tasks=True,  # Обновления обрабатываются параллельно, ограничение - семафор генерации
         )
 
     except KeyboardInterrupt:
@@ -8,11 +8,14 @@ import asyncio
 import subprocess
 import time
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, TYPE_CHECKING
 
 from src.utils.config import config
 from src.utils.logger import get_speech_logger
 
+if TYPE_CHECKING:
+    import numpy as np
+
 class AudioProcessor:
     """Класс для обработки аудиофайлов."""
     
@@ -342,7 +345,72 @@ class AudioProcessor:
         except Exception as e:
             self.logger.error(f"❌ Ошибка подготовки аудио для Whisper: {e}")
             return audio_path
-    
+
+    async def decode_for_whisper(self, audio_data: bytes,
+                                 sample_rate: int = 16000) -> Optional["np.ndarray"]:
+        """
+        Декодирование аудио из памяти в формат Whisper без временных файлов.
+
+        FFmpeg читает байты из stdin и отдает 16-bit PCM в stdout,
+        поэтому голосовое сообщение ни разу не пишется на диск.
+
+        Args:
+            audio_data: Содержимое аудиофайла
+            sample_rate: Частота дискретизации
+
+        Returns:
+            Optional[np.ndarray]: Моно-сигнал float32 в диапазоне [-1, 1] или None при ошибке
+        """
+        if not self.ffmpeg_path:
+            self.logger.error("❌ FFmpeg недоступен для декодирования")
+            return None
+
+        if not audio_data:
+            self.logger.error("❌ Пустые аудиоданные")
+            return None
+
+        try:
+            import numpy as np
+
+            cmd = [
+                self.ffmpeg_path,
+                "-hide_banner",
+                "-i", "pipe:0",          # Вход из stdin
+                "-ar", str(sample_rate), # Частота дискретизации
+                "-ac", "1",              # Моно
+                "-f", "s16le",           # Сырой 16-bit PCM
+                "-loglevel", "error",    # Минимальный вывод
+                "pipe:1"                 # Выход в stdout
+            ]
+
+            start_time = time.time()
+
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+
+            stdout, stderr = await process.communicate(input=audio_data)
+
+            if process.returncode != 0 or not stdout:
+                error_msg = stderr.decode('utf-8', errors='replace')
+                self.logger.error(f"❌ Ошибка FFmpeg декодирования: {error_msg}")
+                return None
+
+            audio = np.frombuffer(stdout, np.int16).astype(np.float32) / 32768.0
+
+            self.logger.debug(
+                f"✅ Аудио декодировано в памяти за {time.time() - start_time:.2f}с: "
+                f"{len(audio_data)} bytes -> {audio.shape[0] / sample_rate:.1f}с"
+            )
+            return audio
+
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка декодирования аудио: {e}")
+            return None
+
     async def validate_audio_file(self, file_path: str) -> bool:
         """
         Валидация аудиофайла.
@@ -4,21 +4,29 @@
 Поддержка multi-GPU для параллельного распознавания речи.
 """
 
-import os
+import io
 import asyncio
 import time
 import whisper
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union, TYPE_CHECKING
 from contextlib import asynccontextmanager
 
 from src.utils.config import config
 from src.utils.logger import get_speech_logger
 from src.speech.audio_processor import AudioProcessor
 
+if TYPE_CHECKING:
+    import numpy as np
+
 # Инициализация логгера
 logger = get_speech_logger()
 
+# Кэш CUDA/MPS аллокатора сбрасывается раз в столько освобождений устройства
+EMPTY_CACHE_EVERY = 64
+
 class WhisperPool:
     """Пул Whisper моделей для параллельного распознавания речи."""
     
@@ -36,7 +44,14 @@ class WhisperPool:
         self.language = language
         self.models: Dict[str, Any] = {}
         self.available_devices = asyncio.Queue(maxsize=len(gpu_devices))
+        self._release_counts: Dict[str, int] = defaultdict(int)
+        # Отдельный поток на устройство: загрузка и распознавание не ждут в общем executor asyncio
+        self.executors: Dict[str, ThreadPoolExecutor] = {
+            device: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"asr-{device}")
+            for device in gpu_devices
+        }
         self._initialized = False
+        self._init_lock = asyncio.Lock()
         
         logger.info(f"🎤 Инициализирован Whisper пул с {len(gpu_devices)} устройствами: {gpu_devices}")
         logger.info(f"   Модель: {model_name}, Язык: {language}")
@@ -46,32 +61,36 @@ class WhisperPool:
         if self._initialized:
             return
         
-        logger.info("📥 Загрузка Whisper моделей на все устройства...")
-        
-        for device in self.gpu_devices:
-            try:
-                model = await self._load_model_for_device(device)
-                if model:
-                    self.models[device] = model
-                    await self.available_devices.put(device)
-                    logger.info(f"✅ Whisper модель загружена для {device}")
-                else:
-                    logger.error(f"❌ Не удалось загрузить Whisper модель для {device}")
-            except Exception as e:
-                logger.error(f"❌ Ошибка загрузки Whisper модели для {device}: {e}")
-        
-        self._initialized = True
-        logger.info(f"🚀 Whisper пул инициализирован с {len(self.models)} активными устройствами")
+        # Параллельные запросы не должны загружать модели повторно
+        async with self._init_lock:
+            if self._initialized:
+                return
+            
+            logger.info("📥 Загрузка Whisper моделей на все устройства...")
+            
+            for device in self.gpu_devices:
+                try:
+                    model = await self._load_model_for_device(device)
+                    if model:
+                        self.models[device] = model
+                        await self.available_devices.put(device)
+                        logger.info(f"✅ Whisper модель загружена для {device}")
+                    else:
+                        logger.error(f"❌ Не удалось загрузить Whisper модель для {device}")
+                except Exception as e:
+                    logger.error(f"❌ Ошибка загрузки Whisper модели для {device}: {e}")
+            
+            self._initialized = True
+            logger.info(f"🚀 Whisper пул инициализирован с {len(self.models)} активными устройствами")
     
     async def _load_model_for_device(self, device: str):
         """Загрузка Whisper модели для конкретного устройства."""
         try:
             logger.debug(f"📥 Загрузка Whisper {self.model_name} на {device}")
             
-            # Загружаем модель в отдельном потоке
-            loop = asyncio.get_event_loop()
-            model = await loop.run_in_executor(
-                None,
+            # Загружаем модель в потоке устройства
+            model = await asyncio.get_running_loop().run_in_executor(
+                self.executors[device],
                 whisper.load_model,
                 self.model_name,
                 device
@@ -107,10 +126,13 @@ class WhisperPool:
             logger.debug(f"🔓 Освобожден Whisper {device}")
     
     def _cleanup_device_memory(self, device: str):
-        """Очистка памяти конкретного устройства."""
+        """Периодическая очистка памяти устройства (раз в EMPTY_CACHE_EVERY освобождений)."""
+        self._release_counts[device] += 1
+        if self._release_counts[device] % EMPTY_CACHE_EVERY:
+            return
+        
         try:
             import torch
-            import gc
             
             if device.startswith("cuda"):
                 with torch.cuda.device(device):
@@ -119,8 +141,6 @@ class WhisperPool:
                 if hasattr(torch.mps, 'empty_cache'):
                     torch.mps.empty_cache()
             
-            gc.collect()
-            
         except Exception as e:
             logger.debug(f"Ошибка очистки памяти Whisper {device}: {e}")
     
@@ -239,10 +259,9 @@ class SpeechToText:
             async with self.whisper_pool.acquire_device() as (device, model):
                 self.logger.info(f"🎮 Транскрибация на {device}")
                 
-                # Запускаем транскрибацию в отдельном потоке
-                loop = asyncio.get_event_loop()
-                result = await loop.run_in_executor(
-                    None, 
+                # Запускаем транскрибацию в потоке устройства
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.whisper_pool.executors[device],
                     self._transcribe_sync, 
                     model, 
                     processed_audio_path
@@ -299,22 +318,91 @@ class SpeechToText:
             )
             return None
     
-    def _transcribe_sync(self, model, audio_path: str) -> Optional[str]:
+    async def transcribe_audio_data(self, audio_data: bytes, user_id: int = None,
+                                    duration: float = 0) -> Optional[str]:
+        """
+        Транскрибирует аудио из памяти без записи на диск.
+        
+        Args:
+            audio_data: Содержимое аудиофайла (например, OGG голосового сообщения)
+            user_id: ID пользователя (для логирования)
+            duration: Длительность аудио в секундах (для логирования)
+            
+        Returns:
+            Optional[str]: Распознанный текст или None при ошибке
+        """
+        start_time = time.time()
+        
+        try:
+            self.logger.info(f"🎤 Начало транскрибации из памяти: {len(audio_data)} bytes")
+            self.logger.info(f"   Длительность: {duration:.1f}с")
+            
+            # Декодируем сразу в формат Whisper (16 kHz, моно)
+            audio = await self.audio_processor.decode_for_whisper(audio_data)
+            
+            if audio is None:
+                self.logger.error("❌ Ошибка декодирования аудио")
+                return None
+            
+            if not self.whisper_pool._initialized:
+                await self.whisper_pool.initialize()
+            
+            async with self.whisper_pool.acquire_device() as (device, model):
+                self.logger.info(f"🎮 Транскрибация на {device}")
+                
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.whisper_pool.executors[device],
+                    self._transcribe_sync,
+                    model,
+                    audio
+                )
+            
+            processing_time = time.time() - start_time
+            
+            if result:
+                self.logger.info(f"✅ Транскрибация завершена за {processing_time:.2f}с")
+            else:
+                self.logger.warning(f"⚠️ Транскрибация не дала результата за {processing_time:.2f}с")
+            
+            if user_id:
+                self.logger.info(
+                    f"user_id={user_id},"
+                    f"audio_duration={duration},"
+                    f"recognition_time={processing_time},"
+                    f"success={bool(result)}"
+                )
+            
+            return result
+            
+        except Exception as e:
+            processing_time = time.time() - start_time
+            self.logger.error(
+                f"error={e},"
+                f"context={{"
+                f'"method": "transcribe_audio_data",'
+                f'"audio_size": {len(audio_data) if audio_data else 0},'
+                f'"user_id": {user_id},'
+                f'"processing_time": {processing_time}'
+                f"}}"
+            )
+            return None
+    
+    def _transcribe_sync(self, model, audio: Union[str, "np.ndarray"]) -> Optional[str]:
         """
         Синхронная транскрибация аудио (выполняется в отдельном потоке).
         
         Args:
             model: Модель Whisper
-            audio_path: Путь к аудиофайлу
+            audio: Путь к аудиофайлу или декодированный сигнал 16 kHz
             
         Returns:
             Optional[str]: Распознанный текст
         """
         try:
-            self.logger.debug(f"🔄 Выполнение синхронной транскрибации: {audio_path}")
+            self.logger.debug("🔄 Выполнение синхронной транскрибации")
             
             result = model.transcribe(
-                audio_path,
+                audio,
                 language=self.language,
                 task="transcribe",
                 # Дополнительные параметры для улучшения качества
@@ -418,34 +506,27 @@ class SpeechToText:
                 )
                 return None
             
-            # Скачиваем файл
             file = await bot.get_file(voice_message.file_id)
             
-            # Создаем имя временного файла
-            filename = f"voice_{user_id}_{int(time.time())}.ogg"
-            audio_path = config.get_temp_audio_path(filename)
-            
-            self.logger.info(f"📥 Скачивание голосового файла: {filename}")
-            self.logger.debug(f"   File ID: {voice_message.file_id}")
+            self.logger.info(f"📥 Скачивание голосового файла в память: {voice_message.file_id}")
             self.logger.debug(f"   Размер: {voice_message.file_size} bytes")
             self.logger.debug(f"   Длительность: {voice_message.duration}s")
             
-            # Скачиваем аудиофайл
-            await bot.download_file(file.file_path, audio_path)
-            
-            self.logger.info(f"✅ Голосовой файл скачан: {audio_path}")
-            
-            # Транскрибируем с использованием пула
-            result = await self.transcribe_audio(audio_path, user_id)
+            # Скачиваем аудио в буфер параллельно с прогревом пула моделей
+            buffer = io.BytesIO()
+            await asyncio.gather(
+                bot.download_file(file.file_path, buffer),
+                self.whisper_pool.initialize()
+            )
             
-            # Удаляем временный файл
-            try:
-                Path(audio_path).unlink()
-                self.logger.debug(f"Удален временный файл: {audio_path}")
-            except Exception as e:
-                self.logger.warning(f"Не удалось удалить временный файл {audio_path}: {e}")
+            self.logger.info(f"✅ Голосовой файл скачан: {buffer.tell()} bytes")
             
-            return result
+            # Транскрибируем из памяти, минуя временные файлы
+            return await self.transcribe_audio_data(
+                buffer.getvalue(),
+                user_id=user_id,
+                duration=voice_message.duration
+            )
             
         except Exception as e:
             self.logger.error(
@@ -5,6 +5,7 @@
 """
 
 import os
+import pickle
 import yaml
 from pathlib import Path
 from dataclasses import dataclass, field
@@ -16,6 +17,59 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения
 load_dotenv()
 
+# Используем C-реализацию LibYAML если она доступна
+try:
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+def _load_yaml(path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Загрузка YAML файла без кэширования.
+    
+    Args:
+        path: Путь к YAML файлу
+        
+    Returns:
+        Разобранные данные файла
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=_YamlLoader)
+
+def _load_with_cache(path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Загрузка YAML файла с кэшированием разобранного результата в pickle.
+    
+    Кэш хранится рядом с исходным файлом (<file>.pkl) и считается актуальным,
+    пока он не старше исходного YAML. Не используется для файлов с секретами:
+    pickle создается с правами по умолчанию и раскрыл бы токен.
+    
+    Args:
+        path: Путь к YAML файлу
+        
+    Returns:
+        Разобранные данные файла
+    """
+    cache_path = path.with_name(path.name + ".pkl")
+    
+    try:
+        if os.stat(cache_path).st_mtime >= os.stat(path).st_mtime:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+    
+    data = _load_yaml(path)
+    
+    # Кэш не обязателен: ошибки записи (например, нет прав) игнорируем
+    try:
+        with open(cache_path, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    
+    return data
+
 @dataclass
 class BotConfig:
     """Конфигурация Telegram бота."""
@@ -49,15 +103,27 @@ class DiffusionConfig:
     device: str = "auto"  # auto, cpu, cuda, mps
     gpu_devices: List[str] = field(default_factory=list)  # Список GPU устройств для multi-GPU
     max_queue_size: int = 10  # Максимальный размер очереди ожидания
+    max_concurrent_generations: int = 0  # Лимит одновременных генераций (0 - по числу GPU)
+    max_queue_wait: int = 300  # Максимальное время ожидания в очереди, секунды (0 - без ограничения)
+    max_batch_size: int = 1  # Сколько запросов объединять в один вызов pipeline (1 - без батчинга)
+    batch_timeout_ms: int = 50  # Сколько ждать попутных запросов для батча, миллисекунды
     width: int = 1024
     height: int = 1024
     num_inference_steps: int = 28
     guidance_scale: float = 7.5
+    scheduler: str = ""  # Замена планировщика: "" (стандартный), "dpmsolver++", "lcm"
     seed: int = -1  # -1 для случайного
+    dtype: str = "auto"  # Тип весов на GPU: auto (bfloat16 для FLUX, float16 для SD), float16, bfloat16
     negative_prompt: str = "blurry, low quality, distorted, deformed, ugly, bad anatomy, watermark, signature"
     preload_model: bool = False
+    fast_cache: bool = False  # Кэшировать загруженный pipeline через torch.save для быстрого старта
     enable_xformers: bool = True
     enable_cpu_offload: bool = True
+    drop_t5: bool = False  # FLUX без текстового энкодера T5 (только CLIP)
+    tiny_vae: bool = False  # Декодирование латентов через AutoencoderTiny (TAESD) вместо полного VAE
+    quantize: str = ""  # Квантование весов UNet/transformer на CUDA: "" (нет), "int8", "fp8"
+    compile_model: bool = False  # torch.compile для UNet/transformer на CUDA (без cpu offload)
+    step_cache_threshold: float = 0.0  # First Block Cache на CUDA: 0 - выключен, ~0.08-0.12 - включен
     num_images: int = 4  # Добавлено поле для количества генерируемых изображений
     prompts: DiffusionPromptsConfig = field(default_factory=DiffusionPromptsConfig)
 
@@ -160,9 +226,14 @@ class Config:
         main_config_path = Path("conf/config.yaml")
         
         if main_config_path.exists():
+            # Сначала пробуем предкомпилированный модуль (см. setup.py)
+            if (data := self._load_compiled_config(main_config_path)) is not None:
+                self._apply_config_data(data)
+                print("✅ Основная конфигурация загружена из предкомпилированного модуля")
+                return
+            
             try:
-                with open(main_config_path, 'r', encoding='utf-8') as f:
-                    data = yaml.safe_load(f)
+                data = _load_with_cache(main_config_path)
                 
                 if data:
                     self._apply_config_data(data)
@@ -172,6 +243,27 @@ class Config:
         else:
             print(f"⚠️ Основная конфигурация не найдена: {main_config_path}")
 
+    def _load_compiled_config(self, source_path: Path) -> Optional[Dict[str, Any]]:
+        """
+        Загрузка предкомпилированной конфигурации из src/utils/_compiled_config.py.
+        
+        Args:
+            source_path: Путь к исходному YAML файлу
+            
+        Returns:
+            Словарь конфигурации или None, если модуль отсутствует или устарел
+        """
+        try:
+            from src.utils import _compiled_config
+        except ImportError:
+            return None
+        
+        if _compiled_config.SOURCE_MTIME != source_path.stat().st_mtime:
+            print("⚠️ Предкомпилированная конфигурация устарела, используется YAML")
+            return None
+        
+        return _compiled_config.CONFIG
+
     def _load_secrets_config(self):
         """Загрузка токенов и секретов из ../../secrets.yaml."""
         # Список возможных путей к файлу с секретами
@@ -188,8 +280,12 @@ class Config:
             path = Path(secrets_path)
             if path.exists():
                 try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        data = yaml.safe_load(f)
+                    # Секреты не кэшируются; кэш от прежних версий удаляем вместе с токеном
+                    data = _load_yaml(path)
+                    try:
+                        path.with_name(path.name + ".pkl").unlink(missing_ok=True)
+                    except OSError:
+                        pass
                     
                     if data:
                         self._apply_config_data(data)
@@ -237,6 +333,14 @@ class Config:
                 self.diffusion.gpu_devices = gpu_devices
             if (max_queue_size := diffusion_config.get("max_queue_size")) is not None:
                 self.diffusion.max_queue_size = max_queue_size
+            if (max_concurrent := diffusion_config.get("max_concurrent_generations")) is not None:
+                self.diffusion.max_concurrent_generations = max_concurrent
+            if (max_queue_wait := diffusion_config.get("max_queue_wait")) is not None:
+                self.diffusion.max_queue_wait = max_queue_wait
+            if (max_batch_size := diffusion_config.get("max_batch_size")) is not None:
+                self.diffusion.max_batch_size = max_batch_size
+            if (batch_timeout_ms := diffusion_config.get("batch_timeout_ms")) is not None:
+                self.diffusion.batch_timeout_ms = batch_timeout_ms
             if (width := diffusion_config.get("width")) is not None:
                 self.diffusion.width = width
             if (height := diffusion_config.get("height")) is not None:
@@ -245,16 +349,32 @@ class Config:
                 self.diffusion.num_inference_steps = steps
             if (guidance := diffusion_config.get("guidance_scale")) is not None:
                 self.diffusion.guidance_scale = guidance
+            if (scheduler := diffusion_config.get("scheduler")) is not None:
+                self.diffusion.scheduler = scheduler
             if (seed := diffusion_config.get("seed")) is not None:
                 self.diffusion.seed = seed
+            if (dtype := diffusion_config.get("dtype")) is not None:
+                self.diffusion.dtype = dtype
             if (negative := diffusion_config.get("negative_prompt")) is not None:
                 self.diffusion.negative_prompt = negative
             if (preload := diffusion_config.get("preload_model")) is not None:
                 self.diffusion.preload_model = preload
+            if (fast_cache := diffusion_config.get("fast_cache")) is not None:
+                self.diffusion.fast_cache = fast_cache
             if (xformers := diffusion_config.get("enable_xformers")) is not None:
                 self.diffusion.enable_xformers = xformers
             if (cpu_offload := diffusion_config.get("enable_cpu_offload")) is not None:
                 self.diffusion.enable_cpu_offload = cpu_offload
+            if (drop_t5 := diffusion_config.get("drop_t5")) is not None:
+                self.diffusion.drop_t5 = drop_t5
+            if (tiny_vae := diffusion_config.get("tiny_vae")) is not None:
+                self.diffusion.tiny_vae = tiny_vae
+            if (quantize := diffusion_config.get("quantize")) is not None:
+                self.diffusion.quantize = quantize
+            if (compile_model := diffusion_config.get("compile_model")) is not None:
+                self.diffusion.compile_model = compile_model
+            if (step_cache_threshold := diffusion_config.get("step_cache_threshold")) is not None:
+                self.diffusion.step_cache_threshold = step_cache_threshold
             if (num_images := diffusion_config.get("num_images")) is not None:
                 self.diffusion.num_images = num_images
             
@@ -449,6 +569,11 @@ class Config:
             errors.append(f"❌ Неверное устройство для генерации: {self.diffusion.device}. "
                          f"Доступные: cpu, cuda, mps, auto")
 
+        # Проверка типа весов для генерации
+        if self.diffusion.dtype not in ["auto", "float16", "bfloat16"]:
+            errors.append(f"❌ Неверный тип весов для генерации: {self.diffusion.dtype}. "
+                         f"Доступные: auto, float16, bfloat16")
+
         # Проверка устройства Whisper
         if self.speech.device not in ["cpu", "cuda", "auto"]:
             errors.append(f"❌ Неверное устройство Whisper: {self.speech.device}. "
@@ -595,6 +720,10 @@ BOT_MESSAGES = {
         "⚠️ Голосовое сообщение слишком длинное!\n"
         f"Максимальная длительность: {config.security.max_voice_duration} секунд"
     ),
+    "rate_limit": (
+        "⏳ Слишком много сообщений!\n"
+        f"Можно отправлять не более {config.security.rate_limit_messages} сообщений в минуту."
+    ),
     "error": (
         "❌ Произошла ошибка при обработке вашего запроса.\n"
         "Попробуйте еще раз или обратитесь к администратору."
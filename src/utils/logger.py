@@ -15,6 +15,21 @@ from datetime import datetime
 # Глобальный реестр логгеров для модульного подхода
 _module_loggers: Dict[str, logging.Logger] = {}
 
+class StructuredFormatter(logging.Formatter):
+    """
+    Форматтер, дописывающий к сообщению структурированные поля.
+    
+    Поля передаются через extra={"stats": {...}} и выводятся как
+    "key=value,key=value" только если запись действительно форматируется.
+    """
+    
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        stats = getattr(record, "stats", None)
+        if stats:
+            fields = ",".join(f"{key}={value}" for key, value in stats.items())
+            record.message = f"{record.message} | {fields}"
+        return super().formatMessage(record)
+
 def setup_logger(
     name: str,
     log_level: str = "INFO",
@@ -74,7 +89,7 @@ def setup_logger(
     
     # Создаем форматтеры
     # Подробный формат для файлов
-    detailed_formatter = logging.Formatter(
+    detailed_formatter = StructuredFormatter(
         log_format,
         datefmt="%Y-%m-%d %H:%M:%S"
     )
@@ -85,7 +100,7 @@ def setup_logger(
     else:
         # Упрощенный формат для консоли
         console_format = "%(asctime)s [%(levelname)s] %(filename)s:%(lineno)d: %(message)s"
-        console_formatter = logging.Formatter(
+        console_formatter = StructuredFormatter(
             console_format,
             datefmt="%H:%M:%S"
         )
@@ -399,6 +414,7 @@ class ModularLogger:
 # Экспорт основных функций
 __all__ = [
     'setup_logger', 
+    'StructuredFormatter',
     'get_module_logger',
     'get_logger_for_module',
     'setup_project_logging',
@@ -11,7 +11,7 @@ import sys
 import signal
 import argparse
 from pathlib import Path
-from typing import List, Optional
+from typing import List
 
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler, FileModifiedEvent, FileCreatedEvent